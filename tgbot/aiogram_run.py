@@ -1,19 +1,163 @@
 import asyncio
 import logging
+import multiprocessing
+import os
 
-from create_bot import bot, dp, scheduler
+from aiogram.webhook.aiohttp_server import (SimpleRequestHandler,
+                                            setup_application)
+from aiohttp import web
+from apscheduler.triggers.interval import IntervalTrigger
+
+from create_bot import (bot, db, dp, scheduler, send_queue, BOT_RUN_MODE,
+                        METRICS_HOST, METRICS_PORT, SCHEDULER_SYNC_INTERVAL,
+                        WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+                        WEB_SERVER_HOST, WEB_SERVER_PORT, WEB_WORKERS)
+from parser.category import menu_cache
+from parser.http_client import http_client
+from parser.page_decoder import page_decoder
 from tgbot.handlers.user_router import user_router
 from tgbot.handlers.admin_panel import admin_router, post_product
+from tgbot.utils.monitoring import (MetricsServer, instrument_dispatcher,
+                                    instrument_scheduler,
+                                    instrument_send_queue)
+from tgbot.utils.watcher import WatchEngine
 
+WATCH_POLL_INTERVAL = int(os.getenv('WATCH_POLL_INTERVAL', '300'))
 
-async def main():
-    logging.basicConfig(level=logging.INFO)
-    scheduler.start()
+metrics_server: MetricsServer | None = None
+scheduler_sync: asyncio.Task | None = None
+
+
+async def sync_scheduler():
+    """
+    Wakes the scheduler regularly so that it picks up jobs that other
+    workers added to or changed in the shared job store.
+    """
+    while True:
+        await asyncio.sleep(SCHEDULER_SYNC_INTERVAL)
+        scheduler.wakeup()
+
+
+async def on_startup(worker: int):
+    global metrics_server, scheduler_sync
+    await http_client.start()
+    await db.ensure_user_index('awaits')
+    menu_cache.start()
+    send_queue.start()
+    # Each worker process has its own registry, scraped on its own port.
+    if METRICS_PORT:
+        metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT + worker)
+        await metrics_server.start()
+    # Scheduled jobs must run once per bot, not once per worker. The
+    # other workers only write their jobs to the shared job store.
+    if worker == 0:
+        watch_engine = WatchEngine(db, send_queue.send_message)
+        scheduler.add_job(watch_engine.poll,
+                          IntervalTrigger(seconds=WATCH_POLL_INTERVAL),
+                          max_instances=1, coalesce=True, id='watch_poll',
+                          jobstore='local')
+        instrument_scheduler(scheduler)
+        scheduler.start()
+        if WEB_WORKERS > 1:
+            scheduler_sync = asyncio.create_task(sync_scheduler())
+    else:
+        scheduler.start(paused=True)
+
+
+async def on_shutdown(worker: int):
+    if scheduler_sync is not None:
+        scheduler_sync.cancel()
+    scheduler.shutdown(wait=False)
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await send_queue.stop()
+    await menu_cache.stop()
+    await http_client.close()
+    page_decoder.close()
+
+
+async def on_webhook_startup(worker: int):
+    if worker == 0:
+        await bot.set_webhook(f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+                              secret_token=WEBHOOK_SECRET,
+                              allowed_updates=dp.resolve_used_update_types(),
+                              drop_pending_updates=True)
+
+
+def setup_dispatcher(worker: int = 0):
+    dp["worker"] = worker
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
     dp.include_router(admin_router)
     dp.include_router(user_router)
+    instrument_dispatcher(dp)
+    instrument_send_queue(send_queue)
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    setup_dispatcher()
     await bot.delete_webhook(drop_pending_updates=True)
     await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types(),
                            skip_updates=True)
 
+
+async def serve_webhook(worker: int):
+    """
+    Serves webhook updates in one worker process.
+
+    Workers bind the same port with SO_REUSEPORT and the kernel spreads
+    incoming connections between them.
+
+    Args:
+        worker (int): The worker number, 0 runs the scheduled jobs.
+    """
+    logging.basicConfig(level=logging.INFO)
+    setup_dispatcher(worker)
+    dp.startup.register(on_webhook_startup)
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot,
+                         secret_token=WEBHOOK_SECRET).register(
+        app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEB_SERVER_HOST, WEB_SERVER_PORT,
+                       reuse_port=WEB_WORKERS > 1)
+    await site.start()
+    logging.info(f"Webhook worker {worker} listening on "
+                 f"{WEB_SERVER_HOST}:{WEB_SERVER_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def run_webhook_worker(worker: int):
+    try:
+        asyncio.run(serve_webhook(worker))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_webhook():
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_webhook_worker, args=(worker,),
+                               name=f"webhook-worker-{worker}")
+               for worker in range(1, WEB_WORKERS)]
+    for process in workers:
+        process.start()
+    try:
+        run_webhook_worker(0)
+    finally:
+        for process in workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if BOT_RUN_MODE == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(main())
\ No newline at end of file
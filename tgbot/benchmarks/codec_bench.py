@@ -0,0 +1,94 @@
+"""
+Compares product codecs on a synthetic 10k-product stack.
+
+Run from the repository root:
+    PYTHONPATH=tgbot python -m tgbot.benchmarks.codec_bench [--count 10000]
+"""
+import argparse
+import random
+import time
+
+from parser.urls import card_url, image_url
+from tgbot.db_handler.codecs import AVAILABLE, ProductCodec
+
+SPECS = ['json', 'json+zlib', 'json+slim', 'json+zlib+slim',
+         'orjson', 'orjson+slim', 'orjson+zlib+slim',
+         'msgpack', 'msgpack+slim', 'msgpack+zlib+slim']
+
+
+def make_products(count: int, seed: int = 0) -> list[dict]:
+    """
+    Generates products shaped like WBParser._extract_relevant_fields output.
+
+    Args:
+        count (int): Number of products.
+        seed (int): Random seed.
+
+    Returns:
+        list[dict]: The products.
+    """
+    rnd = random.Random(seed)
+    products = []
+    for _ in range(count):
+        product_id = rnd.randint(10_000_000, 260_000_000)
+        products.append({
+            'name': f"Товар {rnd.randint(1, 10 ** 6)} для дома и дачи",
+            'brand': rnd.choice(['Xiaomi', 'Samsung', 'Tefal', 'Bosch']),
+            'id': product_id,
+            'totalQuantity': rnd.randint(1, 5000),
+            'reviewRating': round(rnd.uniform(3, 5), 1),
+            'price': rnd.randint(100, 100_000) / 100,
+            'discount': rnd.randint(0, 90),
+            'url': card_url(product_id),
+            'image': image_url(product_id),
+        })
+    return products
+
+
+def bench(codec: ProductCodec, products: list[dict]) -> tuple[float, float,
+                                                              float]:
+    """
+    Measures one codec.
+
+    Args:
+        codec (ProductCodec): The codec.
+        products (list[dict]): The products.
+
+    Returns:
+        tuple[float, float, float]: Bytes per product and encode/decode
+        microseconds per product.
+    """
+    started = time.perf_counter()
+    encoded = [codec.encode(product) for product in products]
+    encode_time = time.perf_counter() - started
+    # Redis returns bytes regardless of what was written.
+    encoded = [value.encode('utf-8') if isinstance(value, str) else value
+               for value in encoded]
+    started = time.perf_counter()
+    decoded = [codec.decode(value) for value in encoded]
+    decode_time = time.perf_counter() - started
+    assert decoded == products
+    count = len(products)
+    return (sum(map(len, encoded)) / count, encode_time / count * 1e6,
+            decode_time / count * 1e6)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--count', type=int, default=10_000)
+    args = arg_parser.parse_args()
+
+    products = make_products(args.count)
+    print(f"{'codec':<20}{'bytes/product':>15}{'encode us':>12}"
+          f"{'decode us':>12}")
+    for spec in SPECS:
+        if not AVAILABLE[spec.split('+')[0]]:
+            print(f"{spec:<20}{'not installed':>15}")
+            continue
+        size, encode_us, decode_us = bench(ProductCodec.from_spec(spec),
+                                           products)
+        print(f"{spec:<20}{size:>15.1f}{encode_us:>12.2f}{decode_us:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
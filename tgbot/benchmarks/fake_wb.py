@@ -0,0 +1,278 @@
+"""
+Local stand-in for the Wildberries endpoints used by the parser.
+
+Serves catalog pages, filters, product details and the main menu with
+configurable latency, error rate and 429 injection. Payloads are
+synthesized deterministically, or taken from recorded responses placed
+in a fixtures directory:
+
+    catalog.json    a recorded catalog page, its products are used
+                    as templates for the synthetic catalog
+    filters.json    served as is for every category
+    detail.json     its first product is used as a template
+    main-menu.json  served as is
+
+Run standalone with:
+    PYTHONPATH=tgbot python -m tgbot.benchmarks.fake_wb --port 8080
+"""
+import argparse
+import asyncio
+import copy
+import json
+import random
+from pathlib import Path
+from typing import Any
+
+from aiohttp import web
+
+BASE_PRODUCT_ID = 10_000_000
+
+
+class FakeWildberries:
+    def __init__(self, total: int = 5000, categories: int = 20,
+                 leaves: int = 10, latency: float = 0.02,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: int = 1, depth_limit: int | None = None,
+                 fixtures: str | None = None, seed: int = 0):
+        """
+        Initializes the FakeWildberries server.
+
+        Args:
+            total (int): Number of products in every category.
+            categories (int): Number of top-level menu categories.
+            leaves (int): Number of leaf categories under each of them.
+            latency (float): Mean response delay in seconds.
+            error_rate (float): Share of requests answered with 500.
+            throttle_rate (float): Share of requests answered with 429.
+            retry_after (int): Retry-After value of 429 responses.
+            depth_limit (Optional[int]): Skip beyond which catalog pages
+            come back empty, like the real catalog depth cap.
+            fixtures (Optional[str]): Directory with recorded payloads.
+            seed (int): Random seed for the injected faults.
+        """
+        self.total = total
+        self.categories = categories
+        self.leaves = leaves
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.depth_limit = depth_limit
+        self.random = random.Random(seed)
+        self.fixtures = self._load_fixtures(fixtures)
+        self.requests: dict[str, int] = {}
+        self._prices: list[int] | None = None
+        self._runner: web.AppRunner | None = None
+        self.base_url: str | None = None
+
+    @staticmethod
+    def _load_fixtures(path: str | None) -> dict[str, Any]:
+        fixtures = {}
+        if path:
+            for name in ('catalog', 'filters', 'detail', 'main-menu'):
+                file = Path(path) / f"{name}.json"
+                if file.exists():
+                    fixtures[name] = json.loads(file.read_text('utf-8'))
+        return fixtures
+
+    def product(self, product_id: int) -> dict[str, Any]:
+        """
+        Builds the catalog entry of a product from its ID.
+
+        Args:
+            product_id (int): The product ID.
+
+        Returns:
+            dict[str, Any]: The product.
+        """
+        templates = self.fixtures.get('catalog', {}).get(
+            'data', {}).get('products')
+        index = product_id - BASE_PRODUCT_ID
+        if templates:
+            product = copy.deepcopy(templates[index % len(templates)])
+        else:
+            basic = 1000 + (index * 7919) % 200_000
+            product = {
+                'name': f"Товар {index}",
+                'brand': f"Бренд {index % 50}",
+                'reviewRating': round(3 + (index % 21) / 10, 1),
+                'sizes': [{'price': {
+                    'basic': basic * 100,
+                    'total': basic * (100 - index % 70),
+                }}],
+            }
+        product['id'] = product_id
+        product['totalQuantity'] = 0 if index % 11 == 0 else index % 500 + 1
+        return product
+
+    def price(self, product_id: int) -> int:
+        if self._prices is None:
+            self._prices = [
+                self.product(BASE_PRODUCT_ID + index)
+                ['sizes'][0]['price']['total']
+                for index in range(self.total)]
+        return self._prices[product_id - BASE_PRODUCT_ID]
+
+    async def _delay_or_fault(self, endpoint: str) -> web.Response | None:
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            return web.Response(status=429, headers={
+                'Retry-After': str(self.retry_after)})
+        if roll < self.throttle_rate + self.error_rate:
+            return web.Response(status=500)
+        return None
+
+    async def catalog(self, request: web.Request) -> web.Response:
+        fault = await self._delay_or_fault('catalog')
+        if fault is not None:
+            return fault
+        skip = int(request.query.get('skip', 0))
+        limit = int(request.query.get('limit', 100))
+        ids = range(BASE_PRODUCT_ID, BASE_PRODUCT_ID + self.total)
+        if 'priceU' in request.query:
+            low, high = map(int, request.query['priceU'].split(';'))
+            ids = [product_id for product_id in ids
+                   if low <= self.price(product_id) <= high]
+        page = [] if self.depth_limit and skip >= self.depth_limit \
+            else ids[skip:skip + limit]
+        return web.json_response({'data': {
+            'total': len(ids),
+            'products': [self.product(product_id) for product_id in page],
+        }})
+
+    async def filters(self, request: web.Request) -> web.Response:
+        fault = await self._delay_or_fault('filters')
+        if fault is not None:
+            return fault
+        if 'filters' in self.fixtures:
+            return web.json_response(self.fixtures['filters'])
+        prices = [self.price(BASE_PRODUCT_ID + index)
+                  for index in range(self.total)]
+        return web.json_response({'data': {'filters': [
+            {'name': 'Бренд', 'key': 'fbrand', 'items': [
+                {'id': index + 1, 'name': f"Бренд {index}"}
+                for index in range(50)]},
+            {'name': 'Цвет', 'key': 'fcolor', 'items': [
+                {'id': index, 'name': name} for index, name in
+                enumerate(['черный', 'белый', 'красный', 'синий'], 1)]},
+            {'name': 'Цена', 'key': 'priceU',
+             'minPriceU': min(prices, default=0),
+             'maxPriceU': max(prices, default=0)},
+        ]}})
+
+    async def detail(self, request: web.Request) -> web.Response:
+        fault = await self._delay_or_fault('detail')
+        if fault is not None:
+            return fault
+        products = []
+        for nm in request.query.get('nm', '').split(';'):
+            if not nm.isdigit():
+                continue
+            if 'detail' in self.fixtures:
+                product = copy.deepcopy(
+                    self.fixtures['detail']['data']['products'][0])
+                product['id'] = int(nm)
+            else:
+                product = self.product(int(nm))
+            products.append(product)
+        return web.json_response({'data': {'products': products}})
+
+    async def main_menu(self, request: web.Request) -> web.Response:
+        fault = await self._delay_or_fault('main-menu')
+        if fault is not None:
+            return fault
+        if 'main-menu' in self.fixtures:
+            return web.json_response(self.fixtures['main-menu'])
+        menu = []
+        for top in range(self.categories):
+            childs = [{'id': top * 1000 + leaf,
+                       'name': f"Категория {top}.{leaf}",
+                       'shard': f"shard{top % 5}",
+                       'query': f"cat={top * 1000 + leaf}"}
+                      for leaf in range(self.leaves)]
+            menu.append({'id': top * 1000, 'name': f"Категория {top}",
+                         'childs': childs})
+        return web.json_response(menu)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/catalog/{shard}/v2/catalog', self.catalog)
+        app.router.add_get('/catalog/{shard}/v4/filters', self.filters)
+        app.router.add_get('/cards/v2/detail', self.detail)
+        app.router.add_get('/vol0/data/main-menu-ru-ru-v2.json',
+                           self.main_menu)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Starts serving in the current event loop.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind, a free one if 0.
+
+        Returns:
+            str: The base URL of the server.
+        """
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def patch_endpoints(base_url: str) -> None:
+    """
+    Points WBParser, Filter and Category at the fake server.
+
+    Args:
+        base_url (str): The base URL of the fake server.
+    """
+    from parser.category import Category, menu_cache
+    from parser.filter import Filter
+    from parser.wb_parser import WBParser
+
+    WBParser.BASE_URL = f"{base_url}/catalog/{{shard}}/v2/catalog"
+    WBParser.PRODUCT_DETAIL_URL = f"{base_url}/cards/v2/detail"
+    Filter.BASE_URL = f"{base_url}/catalog/{{shard}}/v4/filters"
+    Category.BASE_URL = f"{base_url}/vol0/data/main-menu-ru-ru-v2.json"
+    menu_cache.url = Category.BASE_URL
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = FakeWildberries(total=args.total, latency=args.latency,
+                             error_rate=args.error_rate,
+                             throttle_rate=args.throttle_rate,
+                             depth_limit=args.depth_limit,
+                             fixtures=args.fixtures)
+    print(f"Serving on {await server.start(port=args.port)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def add_server_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument('--total', type=int, default=5000)
+    arg_parser.add_argument('--latency', type=float, default=0.02)
+    arg_parser.add_argument('--error-rate', type=float, default=0.0)
+    arg_parser.add_argument('--throttle-rate', type=float, default=0.0)
+    arg_parser.add_argument('--depth-limit', type=int, default=None)
+    arg_parser.add_argument('--fixtures', default=None)
+
+
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument('--port', type=int, default=8080)
+    add_server_arguments(cli)
+    asyncio.run(serve(cli.parse_args()))
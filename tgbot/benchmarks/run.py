@@ -0,0 +1,252 @@
+"""
+Parser and RedisDB benchmarks against the local Wildberries stand-in.
+
+Reports items per second, p50/p99 latency and peak RSS for each
+benchmark. Run from the repository root:
+    PYTHONPATH=tgbot python -m tgbot.benchmarks.run [--only parse,crawl]
+
+RedisDB benchmarks use --redis-host when given, fakeredis otherwise.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+from dataclasses import asdict, dataclass, field
+
+import aiohttp
+
+from tgbot.benchmarks.codec_bench import make_products
+from tgbot.benchmarks.fake_wb import (FakeWildberries, add_server_arguments,
+                                      patch_endpoints)
+
+BENCHMARKS = ('parse', 'crawl', 'filters', 'redis')
+
+
+@dataclass
+class Result:
+    name: str
+    items: int
+    elapsed: float
+    latencies: list[float] = field(default_factory=list, repr=False)
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            'name': self.name,
+            'items': self.items,
+            'elapsed_s': round(self.elapsed, 3),
+            'items_per_s': round(self.items / self.elapsed, 1)
+            if self.elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+
+
+def percentile(sorted_samples: list[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1,
+                round(q / 100 * (len(sorted_samples) - 1)))
+    return sorted_samples[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class LatencyRecorder:
+    """
+    aiohttp trace hook collecting the duration of every request.
+    """
+
+    def __init__(self):
+        self.samples: list[float] = []
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._on_start)
+        self.trace_config.on_request_end.append(self._on_end)
+        self.trace_config.on_request_exception.append(self._on_end)
+
+    async def _on_start(self, session, context, params):
+        context.started = time.perf_counter()
+
+    async def _on_end(self, session, context, params):
+        self.samples.append(time.perf_counter() - context.started)
+
+    def take(self) -> list[float]:
+        samples, self.samples = self.samples, []
+        return samples
+
+
+async def bench_parse(args, recorder: LatencyRecorder) -> Result:
+    from parser.wb_parser import WBParser
+
+    parser = WBParser('shard0', 'cat=1')
+    items = 0
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        items += len(await parser.parse_all_products(
+            max_count=args.max_count))
+    return Result('parse_all_products', items,
+                  time.perf_counter() - started, recorder.take())
+
+
+async def bench_crawl(args, recorder: LatencyRecorder) -> Result:
+    from parser.category import Category
+    from parser.crawler import CatalogCrawler
+    from parser.main import fetch_specific_product_for_category
+
+    started = time.perf_counter()
+    categories = await Category().get_all_leaf_categories()
+    crawler = CatalogCrawler(fetch_specific_product_for_category,
+                             concurrency=args.crawl_concurrency)
+    await crawler.crawl(categories)
+    return Result('leaf_crawl', len(categories),
+                  time.perf_counter() - started, recorder.take())
+
+
+async def bench_filters(args, recorder: LatencyRecorder) -> Result:
+    from parser.filter_cache import filter_cache
+    from parser.wb_parser import WBParser
+
+    filters = [('Бренд', 'Бренд 7'), ('Цвет', 'черный')]
+    filter_cache.invalidate()
+    items = 0
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        for category in range(args.filter_categories):
+            parser = WBParser('shard0', f"cat={category}")
+            if await parser._get_filter_params(filters):
+                items += 1
+    return Result('filter_resolution', items,
+                  time.perf_counter() - started, recorder.take())
+
+
+def make_redis_db(args):
+    from tgbot.db_handler.codecs import ProductCodec
+    from tgbot.db_handler.db_class import RedisDB
+
+    codec = ProductCodec.from_spec(args.codec)
+    if args.redis_host:
+        return RedisDB(args.redis_host, args.redis_port, args.redis_db,
+                       codec=codec)
+    try:
+        import fakeredis
+    except ImportError:
+        return None
+
+    class FakeRedisDB(RedisDB):
+        def _RedisDB__create_db(self):
+            return fakeredis.FakeAsyncRedis()
+
+    return FakeRedisDB('fakeredis', 0, 0, codec=codec)
+
+
+async def bench_redis(args, recorder: LatencyRecorder) -> Result | None:
+    db = make_redis_db(args)
+    if db is None:
+        print("redis: skipped, pass --redis-host or install fakeredis")
+        return None
+    products = make_products(args.stack_size)
+    stack = 'bench:stack'
+    latencies = []
+
+    async def timed(call):
+        op_started = time.perf_counter()
+        result = await call
+        latencies.append(time.perf_counter() - op_started)
+        return result
+
+    items = 0
+    started = time.perf_counter()
+    await timed(db.create_stack(products, stack))
+    items += len(await timed(db.get_all_products(stack)))
+    while popped := await timed(db.pop_n(stack, 100)):
+        items += len(popped)
+    pairs = [(str(product['id']), str(index % 100))
+             for index, product in enumerate(products[:1000])]
+    await timed(db.map_products_to_users(pairs))
+    for user_id in range(200):
+        await timed(db.user_id_exists_in_hash('awaits', str(user_id)))
+    items += len(pairs) + 200
+    elapsed = time.perf_counter() - started
+    await db.r.delete(stack, 'awaits', *[f"awaits:user:{user_id}"
+                                         for user_id in range(100)])
+    return Result('redis_stack_ops', items, elapsed, latencies)
+
+
+async def main(args) -> list[dict]:
+    from parser.http_client import http_client
+    from parser.page_scheduler import page_scheduler
+    from parser.single_flight import catalog_flight
+
+    # Repeated runs must measure requests, not the response cache or
+    # results reused from the previous run.
+    http_client.cache = None
+    catalog_flight.reuse = 0
+    server = FakeWildberries(total=args.total, latency=args.latency,
+                             error_rate=args.error_rate,
+                             throttle_rate=args.throttle_rate,
+                             depth_limit=args.depth_limit,
+                             fixtures=args.fixtures)
+    patch_endpoints(await server.start())
+    if args.rate:
+        page_scheduler.rate = args.rate
+    if args.concurrency:
+        page_scheduler.concurrency = args.concurrency
+    recorder = LatencyRecorder()
+    http_client.trace_configs.append(recorder.trace_config)
+
+    benchmarks = {
+        'parse': bench_parse,
+        'crawl': bench_crawl,
+        'filters': bench_filters,
+        'redis': bench_redis,
+    }
+    summaries = []
+    try:
+        for name in args.only.split(','):
+            result = await benchmarks[name](args, recorder)
+            if result is not None:
+                summaries.append(result.summary())
+                print(json.dumps(summaries[-1], ensure_ascii=False))
+    finally:
+        await http_client.close()
+        await server.stop()
+    return summaries
+
+
+def parse_args() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--only', default=','.join(BENCHMARKS))
+    arg_parser.add_argument('--runs', type=int, default=3)
+    arg_parser.add_argument('--max-count', type=int, default=1000)
+    arg_parser.add_argument('--crawl-concurrency', type=int, default=16)
+    arg_parser.add_argument('--filter-categories', type=int, default=50)
+    arg_parser.add_argument('--rate', type=float, default=None,
+                            help='override the per-host page rate')
+    arg_parser.add_argument('--concurrency', type=int, default=None,
+                            help='override the page concurrency window')
+    arg_parser.add_argument('--stack-size', type=int, default=10_000)
+    arg_parser.add_argument('--codec', default='json')
+    arg_parser.add_argument('--redis-host', default=None)
+    arg_parser.add_argument('--redis-port', type=int, default=6379)
+    arg_parser.add_argument('--redis-db', type=int, default=15)
+    arg_parser.add_argument('--json', default=None,
+                            help='also write the results to this file')
+    add_server_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    unknown = set(args.only.split(',')) - set(BENCHMARKS)
+    if unknown:
+        arg_parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == '__main__':
+    cli_args = parse_args()
+    results = asyncio.run(main(cli_args))
+    if cli_args.json:
+        with open(cli_args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
@@ -5,10 +5,16 @@ from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode, ContentType
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.redis import RedisJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
+from redis.asyncio import Redis
 
+from tgbot.db_handler.codecs import ProductCodec
 from tgbot.db_handler.db_class import RedisDB
+from tgbot.utils.send_queue import SendQueue
 
 # from db_handler.db_class import PostgresHandler
 
@@ -25,16 +31,56 @@ PAYMENT_PROVIDER_TOKEN = os.getenv("PAYMENT_PROVIDER_TOKEN")
 SHOP_ID = os.getenv("SHOP_ID")
 YOOKASSA_AUTH_TOKEN = os.getenv("YOOKASSA_AUTH_TOKEN")
 
-scheduler = AsyncIOScheduler(timezone='Europe/Moscow')
+BOT_RUN_MODE = os.getenv("BOT_RUN_MODE", "polling")
+FSM_STORAGE = os.getenv("FSM_STORAGE", "redis")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "0")) or None
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEB_SERVER_HOST = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
+WEB_SERVER_PORT = int(os.getenv("WEB_SERVER_PORT", "8080"))
+# Long polling can only run in one process; webhook mode forks workers.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1")) \
+    if BOT_RUN_MODE == "webhook" else 1
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+SCHEDULER_SYNC_INTERVAL = float(os.getenv("SCHEDULER_SYNC_INTERVAL", "5"))
+
 admins = [int(admin_id) for admin_id in ADMINS]
 
-db = RedisDB(host="localhost", port=6379, db=0)
+db = RedisDB(host="localhost", port=6379, db=0,
+             codec=ProductCodec.from_spec(os.getenv("REDIS_CODEC", "json")))
+
+# Only worker 0 runs jobs, so with several workers the default job store
+# is shared in Redis and jobs added or changed on any worker reach it.
+# Jobs that cannot be pickled go to the 'local' store of their worker.
+jobstores = {'local': MemoryJobStore()}
+if WEB_WORKERS > 1:
+    jobstores['default'] = RedisJobStore(
+        jobs_key='scheduler:jobs', run_times_key='scheduler:run_times',
+        host=db.host, port=db.port, db=db.db)
+scheduler = AsyncIOScheduler(timezone='Europe/Moscow', jobstores=jobstores)
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 bot = Bot(token=BOT_TOKEN,
           default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# Telegram's global limit is per bot, so every worker gets its share.
+send_queue = SendQueue(bot,
+                       global_rate=float(os.getenv("SEND_GLOBAL_RATE", "30"))
+                       / WEB_WORKERS,
+                       workers=int(os.getenv("SEND_WORKERS", "4")))
 
-dp = Dispatcher(storage=MemoryStorage())
+if FSM_STORAGE == "redis":
+    storage = RedisStorage(Redis(host=db.host, port=db.port, db=db.db),
+                           key_builder=DefaultKeyBuilder(prefix="fsm"),
+                           state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL)
+    # Workers share updates, so events of one chat are serialized
+    # across processes with a Redis lock.
+    events_isolation = storage.create_isolation() if WEB_WORKERS > 1 \
+        else None
+    dp = Dispatcher(storage=storage, events_isolation=events_isolation)
+else:
+    dp = Dispatcher(storage=MemoryStorage())
 
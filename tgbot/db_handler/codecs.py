@@ -0,0 +1,178 @@
+import json
+import zlib
+from typing import Any, Callable
+
+from parser.urls import card_url, image_url
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Encoded values start with MAGIC followed by one flags byte. Legacy
+# values are plain JSON objects and therefore always start with '{'.
+MAGIC = 0xFF
+SERIALIZER_MASK = 0x0F
+FLAG_ZLIB = 0x10
+FLAG_SLIM = 0x20
+
+# Fields rebuilt from the product ID on read when stored slim.
+URL_BUILDERS: dict[str, Callable[[Any], str]] = {
+    'url': card_url,
+    'image': image_url,
+}
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj).encode('utf-8')
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+def _orjson_loads(data: bytes) -> Any:
+    return orjson.loads(data)
+
+
+def _msgpack_dumps(obj: Any) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False)
+
+
+SERIALIZERS: dict[str, tuple[int, Callable[[Any], bytes],
+                             Callable[[bytes], Any]]] = {
+    'json': (1, _json_dumps, json.loads),
+    'orjson': (2, _orjson_dumps, _orjson_loads),
+    'msgpack': (3, _msgpack_dumps, _msgpack_loads),
+}
+SERIALIZERS_BY_ID = {serializer_id: (name, loads)
+                     for name, (serializer_id, _, loads)
+                     in SERIALIZERS.items()}
+AVAILABLE = {
+    'json': True,
+    'orjson': orjson is not None,
+    'msgpack': msgpack is not None,
+}
+
+
+class ProductCodec:
+    """
+    Encodes products stored in Redis stacks.
+
+    Values are written with the configured serializer, optionally
+    zlib-compressed and optionally slim (without URLs that can be rebuilt
+    from the product ID). Decoding recognizes every supported format,
+    including legacy plain JSON, so stacks written with another codec
+    still load.
+    """
+
+    def __init__(self, serializer: str = 'json', compress: bool = False,
+                 slim: bool = False, compress_min_size: int = 128):
+        """
+        Initializes the ProductCodec.
+
+        Args:
+            serializer (str): 'json', 'orjson' or 'msgpack'.
+            compress (bool): Compress values with zlib when it makes
+            them smaller.
+            slim (bool): Drop URL fields and rebuild them on read.
+            compress_min_size (int): Minimal serialized size in bytes
+            worth compressing.
+
+        Raises:
+            ValueError: If the serializer is unknown.
+            ImportError: If the serializer's package is not installed.
+        """
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown serializer: {serializer}")
+        if not AVAILABLE[serializer]:
+            raise ImportError(f"{serializer} is not installed")
+        self.serializer = serializer
+        self.compress = compress
+        self.slim = slim
+        self.compress_min_size = compress_min_size
+        self._serializer_id, self._dumps, _ = SERIALIZERS[serializer]
+
+    @classmethod
+    def from_spec(cls, spec: str) -> 'ProductCodec':
+        """
+        Builds a codec from a spec such as 'msgpack+zlib+slim'.
+
+        Args:
+            spec (str): Serializer name optionally followed by '+zlib'
+            and/or '+slim'.
+
+        Returns:
+            ProductCodec: The codec.
+        """
+        serializer, *options = spec.strip().lower().split('+')
+        return cls(serializer or 'json', compress='zlib' in options,
+                   slim='slim' in options)
+
+    @property
+    def legacy(self) -> bool:
+        return self.serializer == 'json' and not (self.compress or self.slim)
+
+    def encode(self, product: dict) -> bytes | str:
+        """
+        Encodes a product.
+
+        Args:
+            product (dict): The product.
+
+        Returns:
+            bytes | str: The encoded value.
+        """
+        if self.legacy:
+            return json.dumps(product)
+        flags = self._serializer_id
+        if self.slim:
+            product = {key: value for key, value in product.items()
+                       if key not in URL_BUILDERS}
+            flags |= FLAG_SLIM
+        data = self._dumps(product)
+        if self.compress and len(data) >= self.compress_min_size:
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                data = compressed
+                flags |= FLAG_ZLIB
+        return bytes((MAGIC, flags)) + data
+
+    @staticmethod
+    def decode(value: bytes | str) -> dict:
+        """
+        Decodes a product written by any codec configuration.
+
+        Args:
+            value (bytes | str): The stored value.
+
+        Returns:
+            dict: The product.
+
+        Raises:
+            ValueError: If the value is in an unknown or unavailable format.
+        """
+        if isinstance(value, str) or not value or value[0] != MAGIC:
+            return json.loads(value)
+        flags = value[1]
+        name, loads = SERIALIZERS_BY_ID.get(flags & SERIALIZER_MASK,
+                                            (None, None))
+        if name is None or not AVAILABLE[name]:
+            raise ValueError(f"Unsupported product encoding: {flags:#x}")
+        data = value[2:]
+        if flags & FLAG_ZLIB:
+            data = zlib.decompress(data)
+        product = loads(data)
+        if flags & FLAG_SLIM and 'id' in product:
+            for key, build in URL_BUILDERS.items():
+                product[key] = build(product['id'])
+        return product
@@ -1,9 +1,65 @@
-import json
-import redis.asyncio as redis
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
+import redis.asyncio as redis
 
+from metrics_registry import REGISTRY, timed_methods
+from tgbot.db_handler.codecs import ProductCodec
+
+REDIS_DURATION = REGISTRY.histogram(
+    'redis_method_duration_seconds', 'Duration of RedisDB methods.',
+    ('method', 'status'))
+
+# Sets hash[product] = user for each (product, user) pair in ARGV[2:]
+# and keeps the reverse sets ARGV[1] .. user in sync.
+MAP_PRODUCTS_SCRIPT = """
+local prefix = ARGV[1]
+for i = 2, #ARGV, 2 do
+    local product, user = ARGV[i], ARGV[i + 1]
+    local old = redis.call('HGET', KEYS[1], product)
+    if old and old ~= user then
+        redis.call('SREM', prefix .. old, product)
+    end
+    redis.call('HSET', KEYS[1], product, user)
+    redis.call('SADD', prefix .. user, product)
+end
+"""
+
+# Deletes the products in ARGV[2:] from the hash and from the reverse
+# set of the user each of them was mapped to.
+UNMAP_PRODUCTS_SCRIPT = """
+local prefix = ARGV[1]
+for i = 2, #ARGV do
+    local user = redis.call('HGET', KEYS[1], ARGV[i])
+    if user then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+        redis.call('SREM', prefix .. user, ARGV[i])
+    end
+end
+"""
+
+# Removes the watch of user ARGV[1] from the product hash KEYS[1] and from
+# the new watches KEYS[4], and once nobody watches product ARGV[2] drops it
+# from the watched set KEYS[2] and its last polled state from KEYS[3].
+UNWATCH_SCRIPT = """
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('SREM', KEYS[4], ARGV[2] .. ':' .. ARGV[1])
+if redis.call('HLEN', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[2], ARGV[2])
+    redis.call('HDEL', KEYS[3], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+@timed_methods(REDIS_DURATION)
 class RedisDB:
-    def __init__(self, host: str, port: int, db: int):
+    # Hashes that keep a user to product IDs index.
+    USER_INDEXED_HASHES = ('awaits',)
+
+    def __init__(self, host: str, port: int, db: int,
+                 codec: ProductCodec | None = None):
         """
         Initializes the RedisDB instance.
 
@@ -11,11 +67,18 @@ class RedisDB:
             host (str): The Redis server host.
             port (int): The Redis server port.
             db (int): The Redis database number.
+            codec (ProductCodec, optional): Codec for stack products,
+                plain JSON by default.
         """
         self.host = host
         self.port = port
         self.db = db
+        self.codec = codec or ProductCodec()
         self.r = self.__create_db()
+        self.__map_products = self.r.register_script(MAP_PRODUCTS_SCRIPT)
+        self.__unmap_products = self.r.register_script(UNMAP_PRODUCTS_SCRIPT)
+        self.__unwatch = self.r.register_script(UNWATCH_SCRIPT)
+        self.__indexed: set[str] = set()
 
     def __create_db(self) -> redis.Redis:
         """
@@ -26,6 +89,23 @@ class RedisDB:
         """
         return redis.Redis(host=self.host, port=self.port, db=self.db)
 
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = True) -> \
+            AsyncIterator[redis.client.Pipeline]:
+        """
+        Buffers the commands issued in the block and sends them
+        in one round trip when the block exits without an error.
+
+        Args:
+            transaction (bool): Wrap the commands in MULTI/EXEC.
+
+        Yields:
+            redis.client.Pipeline: The pipeline to queue commands on.
+        """
+        async with self.r.pipeline(transaction=transaction) as pipe:
+            yield pipe
+            await pipe.execute()
+
     async def __modify_stack(self, stack_name: str, action: str, product: dict = None, products: list[dict] = None):
         """
         Helper function to perform actions on stack.
@@ -39,9 +119,9 @@ class RedisDB:
         if action == 'delete':
             await self.r.delete(stack_name)
         elif action == 'lpush' and products is not None:
-            await self.r.lpush(stack_name, *[json.dumps(product) for product in products])
+            await self.r.lpush(stack_name, *[self.codec.encode(product) for product in products])
         elif action in ['lpush', 'rpush'] and product is not None:
-            await getattr(self.r, action)(stack_name, json.dumps(product))
+            await getattr(self.r, action)(stack_name, self.codec.encode(product))
         elif action == 'lpop':
             return await self.r.lpop(stack_name)
         elif action == 'lrange':
@@ -55,8 +135,11 @@ class RedisDB:
             products (list[dict]): The list of products to add to the stack.
             stack_name (str): The name of the stack.
         """
-        await self.__modify_stack(stack_name, 'delete')
-        await self.__modify_stack(stack_name, 'lpush', products=products)
+        async with self.pipeline() as pipe:
+            pipe.delete(stack_name)
+            if products:
+                pipe.lpush(stack_name,
+                           *[self.codec.encode(product) for product in products])
 
     async def delete_stack(self, stack_name: str):
         """
@@ -77,6 +160,19 @@ class RedisDB:
         """
         await self.__modify_stack(stack_name, 'lpush', product=product)
 
+    async def add_products_to_stack(self, products: list[dict],
+                                    stack_name: str):
+        """
+        Adds several products to the start of the stack in Redis
+        with a single command.
+
+        Args:
+            products (list[dict]): The products to add.
+            stack_name (str): The name of the stack.
+        """
+        if products:
+            await self.__modify_stack(stack_name, 'lpush', products=products)
+
     async def add_product_to_end_of_stack(self, product: dict, stack_name: str):
         """
         Adds a product to the end of the stack in Redis.
@@ -98,7 +194,7 @@ class RedisDB:
             list[dict]: The list of products.
         """
         products = await self.__modify_stack(stack_name, 'lrange')
-        return [json.loads(product) for product in products]
+        return [self.codec.decode(product) for product in products]
 
     async def get_and_remove_first_product(self, stack_name: str) -> dict | None:
         """
@@ -112,9 +208,28 @@ class RedisDB:
         """
         product_json = await self.__modify_stack(stack_name, 'lpop')
         if product_json:
-            return json.loads(product_json)
+            return self.codec.decode(product_json)
         return None
 
+    async def pop_n(self, stack_name: str, n: int) -> list[dict]:
+        """
+        Atomically retrieves and removes the first n products
+        from the stack in Redis.
+
+        Args:
+            stack_name (str): The name of the stack.
+            n (int): The number of products to pop.
+
+        Returns:
+            list[dict]: The popped products, fewer if the stack is shorter.
+        """
+        if n <= 0:
+            return []
+        async with self.r.pipeline(transaction=True) as pipe:
+            products, _ = await pipe.lrange(stack_name, 0, n - 1) \
+                .ltrim(stack_name, n, -1).execute()
+        return [self.codec.decode(product) for product in products]
+
     async def get_first_product(self, stack_name: str) -> dict | None:
         """
         Retrieves the first product from the stack in Redis.
@@ -127,7 +242,7 @@ class RedisDB:
         """
         product_json = await self.r.lindex(stack_name, 0)
         if product_json:
-            return json.loads(product_json)
+            return self.codec.decode(product_json)
         return None
 
     async def delete_first_product(self, stack_name: str):
@@ -168,7 +283,21 @@ class RedisDB:
             product_id (str): The product ID.
             user_id (str): The user ID.
         """
-        await self.__modify_hash('awaits', 'hset', product_id, user_id)
+        await self.map_products_to_users([(product_id, user_id)])
+
+    async def map_products_to_users(self, pairs: list[tuple[str, str]]):
+        """
+        Adds many product ID to user ID mappings in Redis
+        with a single atomic command, keeping the user index in sync.
+
+        Args:
+            pairs (list[tuple[str, str]]): Product ID and user ID pairs.
+        """
+        if pairs:
+            await self.__map_products(
+                keys=['awaits'],
+                args=[self.__user_index_prefix('awaits'),
+                      *[str(item) for pair in pairs for item in pair]])
 
     async def get_user_id_by_product_id(self, product_id: str) -> int | None:
         """
@@ -192,7 +321,224 @@ class RedisDB:
         Args:
             product_id (str): The product ID.
         """
-        await self.__modify_hash('awaits', 'hdel', product_id)
+        await self.__unmap_products(
+            keys=['awaits'],
+            args=[self.__user_index_prefix('awaits'), product_id])
+
+    async def get_product_ids_by_user_id(self, user_id: str) -> list[str]:
+        """
+        Retrieves the IDs of the products awaiting for a user.
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            list[str]: The product IDs.
+        """
+        await self.ensure_user_index('awaits')
+        product_ids = await self.r.smembers(
+            self.__user_index_key('awaits', user_id))
+        return [product_id.decode('utf-8') for product_id in product_ids]
+
+    @staticmethod
+    def __user_index_prefix(hash_name: str) -> str:
+        return f"{hash_name}:user:"
+
+    def __user_index_key(self, hash_name: str, user_id: str) -> str:
+        return f"{self.__user_index_prefix(hash_name)}{user_id}"
+
+    @staticmethod
+    def __user_index_marker(hash_name: str) -> str:
+        return f"{hash_name}:user-index"
+
+    async def ensure_user_index(self, hash_name: str = 'awaits'):
+        """
+        Builds the user index of a hash once if it was never built,
+        e.g. for mappings written before the index existed. Called at
+        startup and, as a fallback, before the index is first read.
+
+        Args:
+            hash_name (str): The name of the hash.
+
+        Raises:
+            ValueError: If the hash has no user index.
+        """
+        if hash_name not in self.USER_INDEXED_HASHES:
+            raise ValueError(f"Hash {hash_name} has no user index")
+        if hash_name in self.__indexed:
+            return
+        if not await self.r.exists(self.__user_index_marker(hash_name)):
+            await self.rebuild_user_index(hash_name)
+        self.__indexed.add(hash_name)
+
+    async def rebuild_user_index(self, hash_name: str = 'awaits'):
+        """
+        Rebuilds the user to product IDs index of a hash, e.g. for
+        mappings written before the index existed.
+
+        Args:
+            hash_name (str): The name of the hash.
+        """
+        mapping = await self.r.hgetall(hash_name)
+        stale_keys = [key async for key in self.r.scan_iter(
+            match=f"{self.__user_index_prefix(hash_name)}*")]
+        async with self.pipeline() as pipe:
+            if stale_keys:
+                pipe.delete(*stale_keys)
+            for product_id, user_id in mapping.items():
+                pipe.sadd(self.__user_index_key(hash_name,
+                                                user_id.decode('utf-8')),
+                          product_id)
+            pipe.set(self.__user_index_marker(hash_name), 1)
+
+    async def get_snapshot(self, snapshot_name: str) -> dict[str, str]:
+        """
+        Retrieves a catalog snapshot (product ID to packed state) from Redis.
+
+        Args:
+            snapshot_name (str): The name of the snapshot hash.
+
+        Returns:
+            dict[str, str]: Packed product states by product ID.
+        """
+        snapshot = await self.r.hgetall(snapshot_name)
+        return {key.decode('utf-8'): value.decode('utf-8')
+                for key, value in snapshot.items()}
+
+    async def update_snapshot(self, snapshot_name: str,
+                              changed: dict[str, str], removed: list[str]):
+        """
+        Writes changed product states and drops removed products
+        of a catalog snapshot in one round trip.
+
+        Args:
+            snapshot_name (str): The name of the snapshot hash.
+            changed (dict[str, str]): Packed product states by product ID.
+            removed (list[str]): IDs of the products to drop.
+        """
+        if not changed and not removed:
+            return
+        async with self.pipeline() as pipe:
+            if changed:
+                pipe.hset(snapshot_name, mapping=changed)
+            if removed:
+                pipe.hdel(snapshot_name, *removed)
+
+    async def add_watch(self, product_id: str, user_id: str, condition: str):
+        """
+        Registers a user's watch on a product. The watch is marked new
+        until the next poll has checked it against the current state.
+
+        Args:
+            product_id (str): The product ID.
+            user_id (str): The user ID.
+            condition (str): The packed watch condition.
+        """
+        async with self.pipeline() as pipe:
+            pipe.hset(f"watch:{product_id}", user_id, condition)
+            pipe.sadd('watch:ids', product_id)
+            pipe.sadd('watch:new', f"{product_id}:{user_id}")
+
+    async def remove_watch(self, product_id: str, user_id: str) -> bool:
+        """
+        Removes a user's watch on a product, and the product's last
+        polled state once nobody watches it.
+
+        Args:
+            product_id (str): The product ID.
+            user_id (str): The user ID.
+
+        Returns:
+            bool: True if nobody watches the product anymore.
+        """
+        return bool(await self.__unwatch(
+            keys=[f"watch:{product_id}", 'watch:ids', 'watch:state',
+                  'watch:new'],
+            args=[user_id, product_id]))
+
+    async def get_new_watches(self) -> dict[str, set[str]]:
+        """
+        Retrieves the watches not yet checked by a poll.
+
+        Returns:
+            dict[str, set[str]]: User IDs by product ID.
+        """
+        watches: dict[str, set[str]] = {}
+        for member in await self.r.smembers('watch:new'):
+            product_id, _, user_id = member.decode('utf-8').partition(':')
+            watches.setdefault(product_id, set()).add(user_id)
+        return watches
+
+    async def clear_new_watches(self, watches: dict[str, set[str]]):
+        """
+        Marks watches as checked by a poll.
+
+        Args:
+            watches (dict[str, set[str]]): User IDs by product ID.
+        """
+        members = [f"{product_id}:{user_id}"
+                   for product_id, user_ids in watches.items()
+                   for user_id in user_ids]
+        if members:
+            await self.r.srem('watch:new', *members)
+
+    async def get_watched_product_ids(self) -> list[str]:
+        """
+        Retrieves the IDs of all watched products.
+
+        Returns:
+            list[str]: The product IDs.
+        """
+        product_ids = await self.r.smembers('watch:ids')
+        return [product_id.decode('utf-8') for product_id in product_ids]
+
+    async def get_watches(self, product_ids: list[str]) -> \
+            dict[str, dict[str, str]]:
+        """
+        Retrieves the watches of many products in one round trip.
+
+        Args:
+            product_ids (list[str]): The product IDs.
+
+        Returns:
+            dict[str, dict[str, str]]: Packed conditions by user ID
+            for each product ID.
+        """
+        async with self.r.pipeline(transaction=False) as pipe:
+            for product_id in product_ids:
+                pipe.hgetall(f"watch:{product_id}")
+            watches = await pipe.execute()
+        return {product_id: {user_id.decode('utf-8'): condition.decode('utf-8')
+                             for user_id, condition in watch.items()}
+                for product_id, watch in zip(product_ids, watches)}
+
+    async def get_watch_states(self, product_ids: list[str]) -> \
+            dict[str, str]:
+        """
+        Retrieves the last polled states of watched products.
+
+        Args:
+            product_ids (list[str]): The product IDs.
+
+        Returns:
+            dict[str, str]: Packed states by product ID, for the products
+            polled before.
+        """
+        if not product_ids:
+            return {}
+        states = await self.r.hmget('watch:state', product_ids)
+        return {product_id: state.decode('utf-8')
+                for product_id, state in zip(product_ids, states) if state}
+
+    async def set_watch_states(self, states: dict[str, str]):
+        """
+        Stores the polled states of watched products.
+
+        Args:
+            states (dict[str, str]): Packed states by product ID.
+        """
+        if states:
+            await self.r.hset('watch:state', mapping=states)
 
     async def hash_key_exists(self, hash_name: str, key: str) -> bool:
         """
@@ -209,17 +555,19 @@ class RedisDB:
 
     async def user_id_exists_in_hash(self, hash_name: str, user_id: str) -> bool:
         """
-        Checks if a user_id exists in a hash.
+        Checks if a user_id exists in a hash, using the hash's user index.
 
         Args:
-            hash_name (str): The name of the hash.
+            hash_name (str): The name of the hash, one of
+            USER_INDEXED_HASHES.
             user_id (str): The user_id to check.
 
         Returns:
             bool: True if the user_id exists, False otherwise.
+
+        Raises:
+            ValueError: If the hash has no user index.
         """
-        keys = await self.__modify_hash(hash_name, 'hkeys')
-        for key in keys:
-            if await self.__modify_hash(hash_name, 'hget', key) == user_id.encode('utf-8'):
-                return True
-        return False
+        await self.ensure_user_index(hash_name)
+        return bool(await self.r.exists(
+            self.__user_index_key(hash_name, user_id)))
@@ -2,15 +2,17 @@ import logging
 import re
 
 from aiogram import Router, F
-from aiogram.filters import CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, PreCheckoutQuery
 from aiogram.utils.chat_action import ChatActionSender
 
+from parser.wb_parser import detail_coalescer
 from tgbot.create_bot import bot, db, PAYMENT_PROVIDER_TOKEN
 from tgbot.handlers.payment_handler import process_pre_checkout_query, process_successful_payment, PRICE
 from tgbot.keyboards.manage_kb import home_page_kb, main_kb
+from tgbot.utils.watcher import WatchCondition, parse_product_id
 
 user_router = Router()
 logger = logging.getLogger(__name__)
@@ -45,6 +47,37 @@ async def process_product_link(message: Message, state: FSMContext):
 async def handle_pre_checkout_query(pre_checkout_q: PreCheckoutQuery):
     pass
 
+@user_router.message(Command('watch'))
+async def cmd_watch(message: Message, command: CommandObject):
+    args = (command.args or '').split()
+    product_id = parse_product_id(args[0]) if args else None
+    if product_id is None:
+        await message.answer("Использование: /watch <артикул или ссылка> "
+                             "[цена<1500] [скидка>30] [наличие]")
+        return
+    try:
+        condition = WatchCondition.parse(args[1:] or ['наличие'])
+    except ValueError as e:
+        await message.answer(f"Не удалось разобрать условие: {e}")
+        return
+    product = await detail_coalescer.get(product_id)
+    if product is None:
+        await message.answer(f"Товар {product_id} не найден.")
+        return
+    await db.add_watch(product_id, str(message.from_user.id), condition.pack())
+    await message.answer(f"Слежу за товаром {product_id} "
+                         f"({product.get('name', '')}): "
+                         f"{condition.describe()}.")
+
+@user_router.message(Command('unwatch'))
+async def cmd_unwatch(message: Message, command: CommandObject):
+    product_id = parse_product_id(command.args or '')
+    if product_id is None:
+        await message.answer("Использование: /unwatch <артикул или ссылка>")
+        return
+    await db.remove_watch(product_id, str(message.from_user.id))
+    await message.answer(f"Больше не слежу за товаром {product_id}.")
+
 @user_router.message()
 async def handle_successful_payment(message: Message, state: FSMContext):
     pass
\ No newline at end of file
@@ -0,0 +1,287 @@
+import functools
+import inspect
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple,
+                   extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    TYPE = ''
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple[str, ...] = ()):
+        """
+        Initializes the Metric.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The HELP text.
+            labelnames (tuple[str, ...]): Names of the metric labels.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, Any] = {}
+
+    def _key(self, labels: dict[str, Any]) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels "
+                             f"{self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple[str, ...] = (),
+                 function: Callable[[], float] | None = None):
+        """
+        Initializes the Counter.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The HELP text.
+            labelnames (tuple[str, ...]): Names of the metric labels.
+            function (Optional[Callable[[], float]]): Read at render time
+            instead of an incremented value, for unlabelled counters kept
+            by another object.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        if self.function is not None:
+            yield f"{self.name}_total {_format_value(self.function())}"
+            return
+        for key, value in self._values.items():
+            yield (f"{self.name}_total"
+                   f"{_format_labels(self.labelnames, key)} "
+                   f"{_format_value(value)}")
+
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple[str, ...] = (),
+                 function: Callable[[], float] | None = None):
+        """
+        Initializes the Gauge.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The HELP text.
+            labelnames (tuple[str, ...]): Names of the metric labels.
+            function (Optional[Callable[[], float]]): Read at render time
+            instead of a set value, for unlabelled gauges.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def samples(self) -> Iterator[str]:
+        if self.function is not None:
+            yield f"{self.name} {_format_value(self.function())}"
+            return
+        for key, value in self._values.items():
+            yield (f"{self.name}{_format_labels(self.labelnames, key)} "
+                   f"{_format_value(value)}")
+
+
+class Histogram(Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Initializes the Histogram.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The HELP text.
+            labelnames (tuple[str, ...]): Names of the metric labels.
+            buckets (tuple[float, ...]): Increasing bucket upper bounds.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Per-bucket counts, then the sum and the count.
+            state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0
+
+    def samples(self) -> Iterator[str]:
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield (f"{self.name}_bucket"
+                       f"{_format_labels(self.labelnames, key, le)} "
+                       f"{cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {state[-1]}"
+            yield f"{self.name}_sum{labels} {_format_value(state[-2])}"
+            yield f"{self.name}_count{labels} {state[-1]}"
+
+
+class Registry:
+    """
+    Holds the metrics of the process and renders them in the Prometheus
+    text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Adds a metric, returning the registered one if the name is taken
+        by a metric of the same type.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The registered metric.
+
+        Raises:
+            ValueError: If the name is taken by another metric type.
+        """
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric):
+                raise ValueError(f"Metric {metric.name} already registered "
+                                 f"as a {existing.TYPE}")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str,
+                labelnames: tuple[str, ...] = (),
+                function: Callable[[], float] | None = None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames,
+                                     function))
+
+    def gauge(self, name: str, documentation: str,
+              labelnames: tuple[str, ...] = (),
+              function: Callable[[], float] | None = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames,
+                                   function))
+
+    def histogram(self, name: str, documentation: str,
+                  labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames,
+                                       buckets))
+
+    def render(self) -> str:
+        return '\n'.join(metric.render()
+                         for metric in self._metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def timed_methods(histogram: Histogram) -> Callable[[type], type]:
+    """
+    Class decorator recording the duration of every public coroutine
+    method in the histogram, labelled by method name and status.
+
+    Args:
+        histogram (Histogram): Histogram with 'method' and 'status' labels.
+
+    Returns:
+        Callable[[type], type]: The class decorator.
+    """
+    def wrap(method: Callable) -> Callable:
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            status = 'ok'
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                status = 'error'
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started,
+                                  method=method.__name__, status=status)
+        return timed
+
+    def decorate(cls: type) -> type:
+        for name, method in list(vars(cls).items()):
+            if not name.startswith('_') and \
+                    inspect.iscoroutinefunction(method):
+                setattr(cls, name, wrap(method))
+        return cls
+
+    return decorate
@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from bisect import bisect_left
+from typing import Iterable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Highest 'vol' (product_id // 100000) served by basket-01, basket-02, ...
+# Volumes above the last boundary go to the next host.
+DEFAULT_BOUNDARIES = (143, 287, 431, 719, 1007, 1061, 1115, 1169, 1313,
+                      1601, 1655, 1919, 2045, 2189, 2405, 2621)
+
+
+class BasketRouter:
+    """
+    Maps product IDs to the basket-XX image hosts with a bisect lookup
+    over a sorted table of volume boundaries.
+    """
+
+    def __init__(self, boundaries: Iterable[int] = DEFAULT_BOUNDARIES):
+        """
+        Initializes the BasketRouter.
+
+        Args:
+            boundaries (Iterable[int]): Highest volume of each basket host,
+            in host order.
+        """
+        self.boundaries: list[int] = []
+        self.load(boundaries)
+
+    def load(self, boundaries: Iterable[int]) -> None:
+        """
+        Replaces the boundary table, e.g. when Wildberries adds hosts.
+
+        Args:
+            boundaries (Iterable[int]): Highest volume of each basket host.
+
+        Raises:
+            ValueError: If the boundaries are empty or not increasing.
+        """
+        boundaries = [int(boundary) for boundary in boundaries]
+        if not boundaries or any(a >= b for a, b in
+                                 zip(boundaries, boundaries[1:])):
+            raise ValueError("Basket boundaries must be a non-empty "
+                             "strictly increasing list")
+        self.boundaries = boundaries
+
+    @classmethod
+    def from_config(cls, value: str | None) -> 'BasketRouter':
+        """
+        Builds a router from a JSON file path or a comma-separated list
+        of boundaries, falling back to the built-in table.
+
+        Args:
+            value (Optional[str]): The configured boundaries.
+
+        Returns:
+            BasketRouter: The router.
+        """
+        if not value:
+            return cls()
+        try:
+            if os.path.exists(value):
+                with open(value, encoding='utf-8') as file:
+                    boundaries = json.load(file)
+                if isinstance(boundaries, dict):
+                    boundaries = boundaries['boundaries']
+            else:
+                boundaries = value.split(',')
+            return cls(boundaries)
+        except (OSError, KeyError, ValueError) as e:
+            logger.error(f"Invalid basket boundaries {value!r}: {e}")
+            return cls()
+
+    @property
+    def host_count(self) -> int:
+        return len(self.boundaries) + 1
+
+    def host_number(self, vol: int) -> int:
+        """
+        Returns the basket host number serving a volume.
+
+        Args:
+            vol (int): The volume, product_id // 100000.
+
+        Returns:
+            int: The 1-based basket host number.
+        """
+        return bisect_left(self.boundaries, vol) + 1
+
+    @staticmethod
+    def host_name(number: int) -> str:
+        return f"basket-{number:02d}.wbbasket.ru"
+
+    def host(self, product_id: int | str) -> str:
+        """
+        Returns the basket host of a product.
+
+        Args:
+            product_id (int | str): The product ID.
+
+        Returns:
+            str: The basket host name.
+        """
+        return self.host_name(self.host_number(int(product_id) // 100000))
+
+    def hosts(self, product_ids: Iterable[int | str]) -> list[str]:
+        """
+        Returns the basket hosts of a batch of products, looking up
+        each distinct volume only once.
+
+        Args:
+            product_ids (Iterable[int | str]): The product IDs.
+
+        Returns:
+            list[str]: The basket host name of each product.
+        """
+        vols = [int(product_id) // 100000 for product_id in product_ids]
+        by_vol = {vol: self.host_name(self.host_number(vol))
+                  for vol in set(vols)}
+        return [by_vol[vol] for vol in vols]
+
+
+basket_router = BasketRouter.from_config(os.getenv('WB_BASKET_BOUNDARIES'))
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DetailCoalescer:
+    """
+    Merges product-detail lookups made within a short window into one
+    batched upstream call.
+    """
+
+    def __init__(self,
+                 fetch_many: Callable[[list[int]],
+                                      Awaitable[dict[int, dict[str, Any]]]],
+                 window: float = 0.005, max_batch: int = 100):
+        """
+        Initializes the DetailCoalescer.
+
+        Args:
+            fetch_many (Callable[[list[int]], Awaitable[dict[int, dict]]]):
+            Coroutine function returning products by ID for a batch of IDs.
+            window (float): Seconds to wait for more lookups before
+            flushing a batch.
+            max_batch (int): Batch size that triggers an immediate flush.
+        """
+        self.fetch_many = fetch_many
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[int, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def get(self, product_id: int | str) -> dict[str, Any] | None:
+        """
+        Looks up one product, sharing the upstream call with the lookups
+        made around the same time.
+
+        Args:
+            product_id (int | str): The product ID.
+
+        Returns:
+            Optional[dict[str, Any]]: The product details or None
+            if the product was not found.
+        """
+        product_id = int(product_id)
+        future = self._pending.get(product_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[product_id] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._resolve(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, batch: dict[int, asyncio.Future]) -> None:
+        try:
+            products = await self.fetch_many(list(batch))
+        except Exception as e:
+            logger.error(f"Batched detail request failed: {e!r}")
+            products = {}
+        for product_id, future in batch.items():
+            if not future.done():
+                future.set_result(products.get(product_id))
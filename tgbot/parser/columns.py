@@ -0,0 +1,233 @@
+import heapq
+from array import array
+from typing import Iterable, Sequence
+
+from parser.urls import card_url, image_urls
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RANK_KEYS = ('score', 'discount', 'rating')
+
+
+class ProductColumns:
+    """
+    Columnar view of raw catalog products.
+
+    IDs, prices, basic prices, quantities and ratings are kept in
+    parallel arrays, NumPy arrays when NumPy is installed and
+    array.array columns otherwise, so that discounts, filters and top-K
+    ranking run over whole columns. Only the rows that survive are
+    turned back into product dictionaries.
+    """
+
+    def __init__(self, products: list[dict], ids: Sequence[int],
+                 prices: Sequence[int], basics: Sequence[int],
+                 quantities: Sequence[int], ratings: Sequence[float]):
+        """
+        Initializes the ProductColumns from prepared columns;
+        use from_products() to build them from a catalog page.
+
+        Args:
+            products (List[dict]): The raw products, row by row.
+            ids (Sequence[int]): Product IDs.
+            prices (Sequence[int]): Total prices in kopecks.
+            basics (Sequence[int]): Basic prices in kopecks.
+            quantities (Sequence[int]): Quantities in stock.
+            ratings (Sequence[float]): Review ratings.
+        """
+        self.products = products
+        self.ids = ids
+        self.prices = prices
+        self.basics = basics
+        self.quantities = quantities
+        self.ratings = ratings
+        self._discounts = None
+
+    @classmethod
+    def from_products(cls, products: Iterable[dict]) -> 'ProductColumns':
+        """
+        Builds the columns from raw catalog products in a single pass.
+
+        Args:
+            products (Iterable[dict]): The raw products.
+
+        Returns:
+            ProductColumns: The columns.
+        """
+        products = list(products)
+        ids, prices, basics, quantities, ratings = [], [], [], [], []
+        for product in products:
+            price = product['sizes'][0]['price']
+            ids.append(product['id'])
+            prices.append(price['total'])
+            basics.append(price['basic'])
+            quantities.append(product['totalQuantity'])
+            ratings.append(product['reviewRating'])
+        if np is not None:
+            return cls(products, np.array(ids, dtype=np.int64),
+                       np.array(prices, dtype=np.int64),
+                       np.array(basics, dtype=np.int64),
+                       np.array(quantities, dtype=np.int64),
+                       np.array(ratings, dtype=np.float64))
+        return cls(products, array('q', ids), array('q', prices),
+                   array('q', basics), array('q', quantities),
+                   array('d', ratings))
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    @property
+    def discounts(self) -> Sequence[int]:
+        """
+        Discounts in percent, computed once for the whole column.
+        """
+        if self._discounts is None:
+            if np is not None:
+                ratio = np.divide(self.basics - self.prices, self.basics,
+                                  out=np.zeros(len(self), dtype=np.float64),
+                                  where=self.basics > 0)
+                self._discounts = np.rint(ratio * 100).astype(np.int64)
+            else:
+                self._discounts = array('q', (
+                    round((basic - price) / basic * 100) if basic else 0
+                    for basic, price in zip(self.basics, self.prices)))
+        return self._discounts
+
+    @property
+    def scores(self) -> Sequence[float]:
+        """
+        Ranking score of each product: discount times rating.
+        """
+        if np is not None:
+            return self.discounts * self.ratings
+        return array('d', (discount * rating for discount, rating
+                           in zip(self.discounts, self.ratings)))
+
+    def take(self, rows: Sequence[int]) -> 'ProductColumns':
+        """
+        Returns the given rows, in the given order.
+
+        Args:
+            rows (Sequence[int]): Row indexes.
+
+        Returns:
+            ProductColumns: The selected rows.
+        """
+        products = [self.products[row] for row in rows]
+        if np is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            taken = ProductColumns(products, self.ids[rows],
+                                   self.prices[rows], self.basics[rows],
+                                   self.quantities[rows], self.ratings[rows])
+            if self._discounts is not None:
+                taken._discounts = self._discounts[rows]
+            return taken
+
+        def pick(column: array) -> array:
+            return array(column.typecode, (column[row] for row in rows))
+
+        taken = ProductColumns(products, pick(self.ids), pick(self.prices),
+                               pick(self.basics), pick(self.quantities),
+                               pick(self.ratings))
+        if self._discounts is not None:
+            taken._discounts = pick(self._discounts)
+        return taken
+
+    def filter(self, in_stock: bool = True, min_discount: int | None = None,
+               max_price: float | None = None,
+               min_rating: float | None = None) -> 'ProductColumns':
+        """
+        Keeps the products matching every given condition.
+
+        Args:
+            in_stock (bool): Drop products with nothing in stock.
+            min_discount (Optional[int]): Lowest discount in percent.
+            max_price (Optional[float]): Highest price in rubles.
+            min_rating (Optional[float]): Lowest review rating.
+
+        Returns:
+            ProductColumns: The matching products.
+        """
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            if in_stock:
+                mask &= self.quantities > 0
+            if min_discount is not None:
+                mask &= self.discounts >= min_discount
+            if max_price is not None:
+                mask &= self.prices <= max_price * 100
+            if min_rating is not None:
+                mask &= self.ratings >= min_rating
+            return self.take(np.flatnonzero(mask))
+
+        rows = range(len(self))
+        if in_stock:
+            rows = [row for row in rows if self.quantities[row] > 0]
+        if min_discount is not None:
+            discounts = self.discounts
+            rows = [row for row in rows if discounts[row] >= min_discount]
+        if max_price is not None:
+            rows = [row for row in rows
+                    if self.prices[row] <= max_price * 100]
+        if min_rating is not None:
+            rows = [row for row in rows if self.ratings[row] >= min_rating]
+        return self.take(rows)
+
+    def top_k(self, k: int, key: str = 'score') -> 'ProductColumns':
+        """
+        Returns the k best products, best first.
+
+        Args:
+            k (int): Number of products to keep.
+            key (str): 'score' (discount times rating), 'discount'
+            or 'rating'.
+
+        Returns:
+            ProductColumns: The best products.
+
+        Raises:
+            ValueError: If the key is unknown.
+        """
+        if key not in RANK_KEYS:
+            raise ValueError(f"Unknown ranking key: {key}")
+        values = {'score': self.scores, 'discount': self.discounts,
+                  'rating': self.ratings}[key]
+        k = min(k, len(self))
+        if k <= 0:
+            return self.take([])
+        if np is not None:
+            # Select around the k-th largest value instead of sorting
+            # everything; ties keep page order like heapq.nlargest.
+            kth = np.partition(values, len(self) - k)[len(self) - k]
+            above = np.flatnonzero(values > kth)
+            ties = np.flatnonzero(values == kth)[:k - len(above)]
+            rows = np.sort(np.concatenate([above, ties]))
+            rows = rows[np.argsort(-values[rows], kind='stable')]
+            return self.take(rows)
+        return self.take(heapq.nlargest(k, range(len(self)),
+                                        key=values.__getitem__))
+
+    def to_dicts(self) -> list[dict]:
+        """
+        Builds the extracted product dictionaries of the rows,
+        shaped like WBParser._extract_relevant_fields output.
+
+        Returns:
+            List[dict]: The products.
+        """
+        discounts = self.discounts
+        images = image_urls(self.ids)
+        return [{
+            'name': product['name'],
+            'brand': product['brand'],
+            'id': product['id'],
+            'totalQuantity': int(self.quantities[row]),
+            'reviewRating': float(self.ratings[row]),
+            'price': int(self.prices[row]) / 100,
+            'discount': int(discounts[row]),
+            'url': card_url(product['id']),
+            'image': images[row],
+        } for row, product in enumerate(self.products)]
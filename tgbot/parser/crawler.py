@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CategoryKey = tuple[str, str]
+
+
+@dataclass
+class CategoryStats:
+    shard: str
+    query: str
+    products: int = 0
+    elapsed: float = 0.0
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ShardQueue:
+    """
+    Round-robin queue of categories grouped by shard, so that a shard
+    with thousands of leaves cannot starve the others.
+    """
+
+    def __init__(self, categories: list[CategoryKey]):
+        """
+        Initializes the ShardQueue.
+
+        Args:
+            categories (list[tuple[str, str]]): 'shard' and 'query' pairs.
+        """
+        self._queues: dict[str, deque[str]] = {}
+        for shard, query in categories:
+            self._queues.setdefault(shard, deque()).append(query)
+        self._shards = deque(self._queues)
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def pop(self) -> CategoryKey | None:
+        """
+        Takes the next category, rotating over shards.
+
+        Returns:
+            Optional[tuple[str, str]]: The next category or None if empty.
+        """
+        while self._shards:
+            shard = self._shards.popleft()
+            queue = self._queues[shard]
+            if not queue:
+                continue
+            query = queue.popleft()
+            if queue:
+                self._shards.append(shard)
+            return shard, query
+        return None
+
+
+class CrawlCheckpoint:
+    """
+    JSON file with the results of finished categories, used to resume
+    an interrupted crawl.
+
+    The checkpoint is stamped with the start time of the crawl it
+    belongs to and ignored once it is older than max_age, so that an
+    interrupted run is not resumed by a much later one.
+    """
+
+    def __init__(self, path: str, max_age: float = 12 * 3600):
+        """
+        Initializes the CrawlCheckpoint.
+
+        Args:
+            path (str): The checkpoint file.
+            max_age (float): Seconds after the crawl start during which
+            the checkpoint may be resumed.
+        """
+        self.path = path
+        self.max_age = max_age
+        self.started = time.time()
+
+    @staticmethod
+    def _key(shard: str, query: str) -> str:
+        return f"{shard}\t{query}"
+
+    def load(self) -> dict[CategoryKey, list[dict]]:
+        """
+        Loads the results saved by a previous run, unless they are
+        too old; a resumed crawl keeps the start time of that run.
+
+        Returns:
+            dict[tuple[str, str], list[dict]]: Products by category.
+        """
+        self.started = time.time()
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                saved = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Unreadable crawl checkpoint {self.path}: {e}")
+            return {}
+        started = saved.get('started') if isinstance(saved, dict) else None
+        if not isinstance(started, (int, float)) or \
+                self.started - started > self.max_age:
+            logger.info(f"Ignoring stale crawl checkpoint {self.path}")
+            return {}
+        self.started = started
+        return {tuple(key.split('\t', 1)): products
+                for key, products in saved.get('results', {}).items()}
+
+    def _write(self, results: dict[CategoryKey, list[dict]]) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'started': self.started,
+                       'results': {self._key(*key): products
+                                   for key, products in results.items()}},
+                      file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    async def save(self, results: dict[CategoryKey, list[dict]]) -> None:
+        """
+        Atomically writes the results of finished categories.
+
+        Args:
+            results (dict[tuple[str, str], list[dict]]): Products
+            by category.
+        """
+        await asyncio.to_thread(self._write, dict(results))
+
+    def clear(self) -> None:
+        """
+        Removes the checkpoint once every category has been attempted.
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class CatalogCrawler:
+    """
+    Crawls many leaf categories in parallel under a global concurrency
+    budget, checkpointing finished categories as it goes.
+    """
+
+    def __init__(self,
+                 fetch: Callable[[str, str], Awaitable[list[dict]]],
+                 concurrency: int = 16,
+                 checkpoint_path: str | None = None,
+                 checkpoint_every: int = 25,
+                 checkpoint_max_age: float = 12 * 3600):
+        """
+        Initializes the CatalogCrawler.
+
+        Args:
+            fetch (Callable[[str, str], Awaitable[list[dict]]]): Coroutine
+            function returning the products of one 'shard' and 'query';
+            it must raise if the category failed, so that it is neither
+            counted as done nor checkpointed.
+            concurrency (int): Number of categories crawled at once.
+            checkpoint_path (Optional[str]): File to save progress to,
+            progress is not saved if None.
+            checkpoint_every (int): Finished categories between saves.
+            checkpoint_max_age (float): Seconds after which a checkpoint
+            left by an interrupted crawl is no longer resumed.
+        """
+        self.fetch = fetch
+        self.concurrency = concurrency
+        self.checkpoint = (CrawlCheckpoint(checkpoint_path,
+                                           checkpoint_max_age)
+                           if checkpoint_path else None)
+        self.checkpoint_every = checkpoint_every
+        self.stats: list[CategoryStats] = []
+
+    async def _crawl_category(self, shard: str, query: str) -> \
+            tuple[CategoryStats, list[dict]]:
+        stats = CategoryStats(shard, query)
+        started = time.monotonic()
+        products = []
+        try:
+            products = await self.fetch(shard, query)
+        except Exception as e:
+            stats.error = f"{type(e).__name__}: {e}"
+            logger.error(f"Category {shard} {query} failed: {stats.error}")
+        stats.elapsed = time.monotonic() - started
+        stats.products = len(products)
+        return stats, products
+
+    async def crawl(self, categories: list[CategoryKey]) -> \
+            dict[CategoryKey, list[dict]]:
+        """
+        Crawls the given categories, skipping those finished by
+        an interrupted previous run.
+
+        The checkpoint is removed once every category has been attempted,
+        failed ones included; they are listed by report() and logged.
+
+        Args:
+            categories (list[tuple[str, str]]): 'shard' and 'query' pairs.
+
+        Returns:
+            dict[tuple[str, str], list[dict]]: Products by category.
+        """
+        results = self.checkpoint.load() if self.checkpoint else {}
+        pending = [key for key in dict.fromkeys(categories)
+                   if key not in results]
+        if results:
+            logger.info(f"Resuming crawl: {len(results)} categories done, "
+                        f"{len(pending)} left")
+        queue = ShardQueue(pending)
+        self.stats = []
+        started = time.monotonic()
+        unsaved = 0
+
+        async def worker():
+            nonlocal unsaved
+            while (category := queue.pop()) is not None:
+                stats, products = await self._crawl_category(*category)
+                self.stats.append(stats)
+                if not stats.ok:
+                    continue
+                results[category] = products
+                unsaved += 1
+                if self.checkpoint and unsaved >= self.checkpoint_every:
+                    unsaved = 0
+                    await self.checkpoint.save(results)
+
+        attempted = False
+        try:
+            await asyncio.gather(*(worker() for _ in range(
+                min(self.concurrency, len(queue)))))
+            attempted = True
+        finally:
+            if self.checkpoint:
+                if attempted:
+                    self.checkpoint.clear()
+                else:
+                    await self.checkpoint.save(results)
+        self._log_report(time.monotonic() - started)
+        return results
+
+    def _log_report(self, elapsed: float, slowest: int = 10) -> None:
+        """
+        Logs the slowest categories and the crawl summary.
+
+        Args:
+            elapsed (float): Wall time of the crawl in seconds.
+            slowest (int): Number of slowest categories to log.
+        """
+        for stats in sorted(self.stats, key=lambda s: s.elapsed,
+                            reverse=True)[:slowest]:
+            logger.info(f"{stats.shard} {stats.query}: {stats.products} "
+                        f"products in {stats.elapsed:.2f}s"
+                        f"{'' if stats.ok else ' (failed)'}")
+        failed = [f"{stats.shard} {stats.query}" for stats in self.stats
+                  if not stats.ok]
+        if failed:
+            logger.warning(f"{len(failed)} categories failed: "
+                           f"{', '.join(failed)}")
+        succeeded = sum(stats.ok for stats in self.stats)
+        logger.info(f"Crawled {succeeded}/{len(self.stats)} categories, "
+                    f"{sum(s.products for s in self.stats)} products "
+                    f"in {elapsed:.2f}s")
+
+    def report(self) -> dict[str, Any]:
+        """
+        Summarizes the last crawl.
+
+        Returns:
+            dict[str, Any]: Counts of crawled, succeeded and failed
+            categories, products and per-category stats.
+        """
+        return {
+            'categories': len(self.stats),
+            'succeeded': sum(stats.ok for stats in self.stats),
+            'failed': [(stats.shard, stats.query) for stats in self.stats
+                       if not stats.ok],
+            'products': sum(stats.products for stats in self.stats),
+            'stats': self.stats,
+        }
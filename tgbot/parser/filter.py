@@ -1,7 +1,12 @@
 import logging
+from functools import partial
 from typing import Any
 
-import aiohttp
+from yarl import URL
+
+from parser.filter_cache import FilterCache, FilterIndex, filter_cache
+from parser.http_client import HttpClient, http_client
+from parser.page_scheduler import PageScheduler, page_scheduler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -10,9 +15,16 @@ logger = logging.getLogger(__name__)
 class Filter:
     BASE_URL = 'https://catalog.wb.ru/catalog/{shard}/v4/filters'
 
-    def __init__(self, shard: str, query: str):
+    def __init__(self, shard: str, query: str,
+                 client: HttpClient | None = None,
+                 cache: FilterCache | None = None,
+                 scheduler: PageScheduler | None = None):
         self.shard = shard
         self.query = query
+        self.client = client or http_client
+        self.cache = cache or filter_cache
+        self.scheduler = scheduler or page_scheduler
+        self.host = URL(self.BASE_URL).host
 
     async def get_filter_params(self, filter_name: str,
                                 filter_value_name: str) -> tuple[None, None] | \
@@ -27,12 +39,54 @@ class Filter:
             and filter value ID if found,
             otherwise None.
         """
+        [params] = await self.get_filters_params(
+            [(filter_name, filter_value_name)])
+        return params
+
+    async def get_filters_params(self, filters: list[tuple[str, str]]) -> \
+            list[tuple[Any, Any] | tuple[None, None]]:
+        """
+        Get the filter parameters for several filters with a single
+        filters document lookup.
+        Args:
+            filters (List[Tuple[str, str]]): Filter names and filter
+            value names.
+        Returns:
+            List[Tuple[str, str]]: The filter key and filter value ID
+            for each filter, (None, None) for those not found.
+        """
+        index = await self.get_filter_index()
+        if index is None:
+            return [(None, None)] * len(filters)
+        return [index.get(filter_name, {}).get(filter_value_name,
+                                               (None, None))
+                for filter_name, filter_value_name in filters]
+
+    async def get_filter_index(self) -> FilterIndex | None:
+        """
+        Get the cached {filter_name: {value_name: (key, id)}} index
+        of the category, fetching the filters document on a miss.
+        Returns:
+            Optional[FilterIndex]: The filter index if the filters
+            could be fetched, otherwise None.
+        """
         params = self._build_params()
-        filters = await self.fetch_filters(params)
-        if filters is None:
-            return None, None
+        return await self.cache.get((self.shard, params['cat']),
+                                    lambda: self.fetch_filters(params))
 
-        return self._find_filter(filters, filter_name, filter_value_name)
+    async def get_price_range(self) -> tuple[int, int] | None:
+        """
+        Get the lowest and highest price of the category in kopecks,
+        as used by the priceU catalog parameter, from the cached
+        filter index.
+        Returns:
+            Optional[Tuple[int, int]]: The price bounds if the filters
+            could be fetched and list them, otherwise None.
+        """
+        index = await self.get_filter_index()
+        if index is None:
+            return None
+        return index.price_range
 
     def _build_params(self):
         return {
@@ -44,10 +98,25 @@ class Filter:
             'spp': '30'
         }
 
+    async def _request_filters(self, params: dict[str, str]) -> \
+            dict[str, Any]:
+        """
+        Requests the filters document, raising on failure so that
+        the page scheduler can retry it.
+        Args:
+            params (Dict[str, str]): The parameters to be used in the request.
+        Returns:
+            Dict[str, Any]: JSON response as a dictionary.
+        """
+        return await self.client.get_json(
+            self.BASE_URL.format(shard=self.shard), params=params)
+
     async def fetch_filters(self, params: dict[str, str]) -> dict[
                                                                  str, Any] | None:
         """
-        Fetches filters using the provided parameters.
+        Fetches filters using the provided parameters, retried with
+        backoff under the rate limit, retry budget and circuit breaker
+        of the catalog host.
         Args:
             params (Dict[str, str]): The parameters to be used in the request.
         Returns:
@@ -56,40 +125,5 @@ class Filter:
             if successful,
             otherwise None.
         """
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.BASE_URL.format(shard=self.shard),
-                                       params=params) as response:
-                    response.raise_for_status()
-                    return await response.json()
-        except aiohttp.ClientError as e:
-            logger.error(f"HTTP error occurred: {e}")
-        except ValueError as e:
-            logger.error(f"JSON decode error: {e}")
-        return None
-
-    def _find_filter(
-            self,
-            filters: dict[str, Any],
-            filter_name: str,
-            filter_value_name: str
-    ) -> tuple[Any, Any] | tuple[None, None]:
-        """
-        Finds a filter key and value ID based on the given filters,
-        filter name, and filter value name.
-        Args:
-            filters (Dict[str, Any]): The filters dictionary.
-            filter_name (str): The name of the filter.
-            filter_value_name (str): The name of the filter value.
-        Returns:
-            Optional[Tuple[str, str]]: A tuple containing
-            the filter key and filter value ID if found,
-                                       otherwise None.
-        """
-        for filterer in filters.get('data', {}).get('filters', []):
-            if filterer['name'] == filter_name:
-                filter_key = filterer['key']
-                for value in filterer.get('items', []):
-                    if value['name'] == filter_value_name:
-                        return filter_key, value['id']
-        return None, None
+        return await self.scheduler.fetch(
+            self.host, partial(self._request_filters, params))
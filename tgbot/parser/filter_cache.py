@@ -0,0 +1,119 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from parser.single_flight import SingleFlight
+
+
+class FilterIndex(dict[str, dict[str, tuple[Any, Any]]]):
+    """
+    {filter_name: {value_name: (key, id)}} index of a filters document,
+    with the category price bounds in kopecks if the document lists them.
+    """
+    price_range: tuple[int, int] | None = None
+
+
+def build_filter_index(filters: dict[str, Any]) -> FilterIndex:
+    """
+    Builds a {filter_name: {value_name: (key, id)}} index from a filters
+    document, keeping the first match like a linear scan would, and
+    picks up the priceU bounds.
+
+    Args:
+        filters (Dict[str, Any]): The filters dictionary.
+
+    Returns:
+        FilterIndex: The filter index.
+    """
+    index = FilterIndex()
+    for filterer in filters.get('data', {}).get('filters', []):
+        if filterer.get('key') == 'priceU' and 'maxPriceU' in filterer \
+                and index.price_range is None:
+            index.price_range = (int(filterer.get('minPriceU', 0)),
+                                 int(filterer['maxPriceU']))
+        values = index.setdefault(filterer['name'], {})
+        for value in filterer.get('items', []):
+            values.setdefault(value['name'], (filterer['key'], value['id']))
+    return index
+
+
+class FilterCache:
+    """
+    TTL and LRU bounded cache of filter indexes keyed by (shard, cat).
+
+    Concurrent misses for the same key share one in-flight fetch.
+    """
+
+    def __init__(self, ttl: float = 900.0, max_size: int = 256):
+        """
+        Initializes the FilterCache.
+
+        Args:
+            ttl (float): Seconds an index is considered fresh.
+            max_size (int): Maximum number of cached categories.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[float, FilterIndex]] = \
+            OrderedDict()
+        self._flight = SingleFlight('filters', reuse=0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: Hashable,
+                  fetch: Callable[[], Awaitable[dict[str, Any] | None]]
+                  ) -> FilterIndex | None:
+        """
+        Returns the cached index or loads it with the fetch callable.
+
+        Args:
+            key (Hashable): The cache key, e.g. (shard, cat).
+            fetch (Callable[[], Awaitable[Optional[Dict[str, Any]]]]):
+            Coroutine factory returning the filters document or None.
+
+        Returns:
+            Optional[FilterIndex]: The filter index or None
+            if it could not be fetched.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, index = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return index
+            del self._entries[key]
+
+        return await self._flight.do(key, lambda: self._load(key, fetch))
+
+    async def _load(self, key: Hashable,
+                    fetch: Callable[[], Awaitable[dict[str, Any] | None]]
+                    ) -> FilterIndex | None:
+        filters = await fetch()
+        if filters is None:
+            return None
+        index = build_filter_index(filters)
+        self._entries[key] = (time.monotonic() + self.ttl, index)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return index
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """
+        Drops one cached index or the whole cache.
+
+        Args:
+            key (Optional[Hashable]): The key to drop, everything if None.
+        """
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+filter_cache = FilterCache(
+    ttl=float(os.getenv('WB_FILTER_CACHE_TTL', '900')),
+    max_size=int(os.getenv('WB_FILTER_CACHE_SIZE', '256')),
+)
@@ -0,0 +1,220 @@
+import asyncio
+import contextvars
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import aiohttp
+from yarl import URL
+
+from parser.metrics import http_trace_config
+from parser.response_cache import ResponseCache, response_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+json_loads: Callable[[str | bytes], Any] = orjson.loads if orjson \
+    else json.loads
+
+# Awaited right before a request goes out, e.g. to take a rate-limit
+# token, so that responses served from the cache cost no token.
+RATE_LIMIT: contextvars.ContextVar[Callable[[], Awaitable[None]] | None] = \
+    contextvars.ContextVar('rate_limit', default=None)
+
+
+class HttpClient:
+    """
+    Long-lived HTTP client shared by WBParser, Filter and Category.
+
+    Keeps a single keep-alive connection pool with cached DNS lookups,
+    so consecutive requests to the same Wildberries host reuse an open
+    TCP/TLS connection instead of performing a new handshake.
+    GET bodies of cacheable endpoints are served from the response
+    cache when one is configured.
+    """
+    DEFAULT_HOST_LIMITS = {
+        'catalog.wb.ru': 16,
+        'card.wb.ru': 8,
+        'static-basket-01.wbbasket.ru': 2,
+    }
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 8,
+                 host_limits: dict[str, int] | None = None,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 60.0,
+                 timeout: float = 30.0,
+                 trace_configs: list[aiohttp.TraceConfig] | None = None,
+                 cache: ResponseCache | None = None):
+        """
+        Initializes the HttpClient.
+
+        Args:
+            limit (int): Total number of simultaneous connections.
+            limit_per_host (int): Connection cap for hosts not listed
+            in host_limits.
+            host_limits (Optional[Dict[str, int]]): Per-host connection caps.
+            dns_cache_ttl (int): Seconds to keep resolved DNS entries.
+            keepalive_timeout (float): Seconds to keep idle connections open.
+            timeout (float): Total timeout of a single request in seconds.
+            trace_configs (Optional[List[aiohttp.TraceConfig]]): Request
+            tracing hooks, applied when the pool is (re)opened.
+            cache (Optional[ResponseCache]): Persistent response cache
+            used by get_json() and get_bytes().
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.host_limits = dict(self.DEFAULT_HOST_LIMITS)
+        if host_limits:
+            self.host_limits.update(host_limits)
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.trace_configs = list(trace_configs or [])
+        self.cache = cache
+        self._session: aiohttp.ClientSession | None = None
+        self._host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    async def start(self) -> None:
+        """
+        Opens the connection pool. Safe to call more than once.
+        """
+        if not self.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=max([self.limit_per_host,
+                                *self.host_limits.values()]),
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout,
+            trace_configs=self.trace_configs or None)
+        logger.info("HTTP client started")
+
+    async def close(self) -> None:
+        """
+        Closes the connection pool and all idle connections.
+        """
+        if self.closed:
+            return
+        if self.cache is not None:
+            await self.cache.close()
+        await self._session.close()
+        self._session = None
+        self._host_semaphores.clear()
+        logger.info("HTTP client closed")
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """
+        Returns the semaphore capping concurrent requests to the URL's host.
+
+        Args:
+            url (str): The request URL.
+
+        Returns:
+            asyncio.Semaphore: The semaphore of the host.
+        """
+        host = URL(url).host
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(
+                self.host_limits.get(host, self.limit_per_host))
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str,
+                      params: dict[str, Any] | None = None,
+                      headers: dict[str, str] | None = None
+                      ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Performs a request through the shared pool.
+
+        The pool is opened lazily, so the client also works in scripts
+        that never call start() explicitly. Inside a scheduled call the
+        request first waits for the scheduler's rate limit.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            params (Optional[Dict[str, Any]]): Query parameters.
+            headers (Optional[Dict[str, str]]): Extra request headers.
+
+        Yields:
+            aiohttp.ClientResponse: The response.
+        """
+        if self.closed:
+            await self.start()
+        rate_limit = RATE_LIMIT.get()
+        if rate_limit is not None:
+            await rate_limit()
+        async with self._host_semaphore(url):
+            async with self._session.request(method, url, params=params,
+                                             headers=headers) as response:
+                yield response
+
+    def get(self, url: str, params: dict[str, Any] | None = None,
+            headers: dict[str, str] | None = None):
+        return self.request('GET', url, params=params, headers=headers)
+
+    async def get_json(self, url: str,
+                       params: dict[str, Any] | None = None) -> Any:
+        """
+        Fetches a URL and decodes its JSON body.
+
+        Args:
+            url (str): The URL to fetch.
+            params (Optional[Dict[str, Any]]): Query parameters.
+
+        Returns:
+            Any: The decoded JSON body.
+
+        Raises:
+            aiohttp.ClientError: If the request fails or returns an error
+            status.
+            ValueError: If the body is not valid JSON.
+        """
+        return json_loads(await self.get_bytes(url, params=params))
+
+    async def _read(self, url: str,
+                    params: dict[str, Any] | None = None) -> bytes:
+        async with self.get(url, params=params) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def get_bytes(self, url: str,
+                        params: dict[str, Any] | None = None) -> bytes:
+        """
+        Fetches a URL and returns its raw body, e.g. to decode it
+        off the event loop.
+
+        Args:
+            url (str): The URL to fetch.
+            params (Optional[Dict[str, Any]]): Query parameters.
+
+        Returns:
+            bytes: The response body.
+
+        Raises:
+            aiohttp.ClientError: If the request fails or returns an error
+            status.
+        """
+        if self.cache is None:
+            return await self._read(url, params)
+        return await self.cache.fetch(url, params,
+                                      lambda: self._read(url, params))
+
+
+http_client = HttpClient(trace_configs=[http_trace_config()],
+                         cache=response_cache)
@@ -1,29 +1,75 @@
 import asyncio
 import logging
+import os
 import random
 from typing import Any, List
 
 from parser.category import Category
+from parser.crawler import CatalogCrawler
+from parser.profiling import profiled
 from parser.wb_parser import WBParser
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', '16'))
+CRAWL_CHECKPOINT = os.getenv('CRAWL_CHECKPOINT', 'crawl_checkpoint.json')
+CRAWL_CHECKPOINT_MAX_AGE = float(os.getenv('CRAWL_CHECKPOINT_MAX_AGE',
+                                           '43200'))
+
 
 async def fetch_specific_product_for_category(shard: str, query: str,
                                             filters: list = None) -> list[
     dict]:
-    pass
+    """
+    Fetches a random in-stock product from the first catalog page
+    of a category.
+
+    Args:
+        shard (str): The shard identifier for the catalog.
+        query (str): The query string for the catalog.
+        filters (Optional[List[Tuple[str, str]]]): A list of tuples
+        containing filter names and filter value names.
+
+    Returns:
+        List[dict]: A list with the chosen product, empty if the category
+        has no products in stock.
+
+    Raises:
+        RuntimeError: If the first page failed, or no products came back
+        while pages failed, so that the crawler records the category
+        as failed instead of done.
+    """
+    parser = WBParser(shard, query)
+    products = await parser.parse_all_products(filters, limit=100,
+                                               max_count=100)
+    if (None, 0) in parser.failed_skips or \
+            (not products and parser.failed_skips):
+        raise RuntimeError(f"{len(parser.failed_skips)} catalog pages "
+                           f"failed")
+    if not products:
+        return []
+    return [random.choice(products)]
 
 
+@profiled()
 async def main_parsing() -> list[Any]:
     """
     Main parsing function that fetches single products from each leaf category.
 
+    Set WB_PROFILE=main_parsing to write a profile report of the crawl.
+
     Returns:
         List[dict]: A list of parsed product dictionaries.
     """
-    flat_list = None
+    categories = await Category().get_all_leaf_categories()
+    crawler = CatalogCrawler(fetch_specific_product_for_category,
+                             concurrency=CRAWL_CONCURRENCY,
+                             checkpoint_path=CRAWL_CHECKPOINT,
+                             checkpoint_max_age=CRAWL_CHECKPOINT_MAX_AGE)
+    results = await crawler.crawl(categories)
+    flat_list = [product for products in results.values()
+                 for product in products]
     return flat_list
 
 
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import Any
+
+from yarl import URL
+
+from parser.http_client import HttpClient, http_client
+from parser.page_scheduler import PageScheduler, page_scheduler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MenuIndex:
+    """
+    Lookup tables precomputed from the main-menu category tree.
+    """
+
+    def __init__(self, data: list[dict[str, Any]]):
+        """
+        Walks the tree once and builds the leaf, name and id indexes.
+
+        Args:
+            data (list[dict[str, Any]]): The main-menu category tree.
+        """
+        self.data = data
+        self.leaves: list[tuple[str, str]] = []
+        self.by_name: dict[str, list[dict[str, Any]]] = {}
+        self.by_id: dict[int, dict[str, Any]] = {}
+
+        stack = list(reversed(data))
+        while stack:
+            category = stack.pop()
+            if 'name' in category:
+                self.by_name.setdefault(category['name'], []).append(category)
+            if 'id' in category:
+                self.by_id[category['id']] = category
+            if 'childs' in category:
+                stack.extend(reversed(category['childs']))
+            elif 'shard' in category and 'query' in category:
+                self.leaves.append((category['shard'], category['query']))
+
+    def find_by_names(self, names: list[str]) -> list[dict[str, Any]]:
+        """
+        Returns the categories with the specified names.
+
+        Args:
+            names (list[str]): The category names.
+
+        Returns:
+            list[dict[str, Any]]: The matching categories.
+        """
+        return [category for name in dict.fromkeys(names)
+                for category in self.by_name.get(name, [])]
+
+
+class MenuCache:
+    """
+    Process-wide cache of the main-menu tree.
+
+    The menu is revalidated with ETag/If-Modified-Since once the TTL
+    expires, either lazily on access or by the background refresh task,
+    and the last good copy is served while Wildberries is unreachable.
+    """
+
+    def __init__(self, url: str, ttl: float = 3600.0,
+                 retry_interval: float = 60.0,
+                 client: HttpClient | None = None,
+                 scheduler: PageScheduler | None = None):
+        """
+        Initializes the MenuCache.
+
+        Args:
+            url (str): URL of the main-menu JSON document.
+            ttl (float): Seconds a fetched menu is considered fresh.
+            retry_interval (float): Seconds to wait after a failed refresh
+            before trying again.
+            client (Optional[HttpClient]): HTTP client to use, defaults
+            to the shared pooled client.
+            scheduler (Optional[PageScheduler]): Page scheduler retrying
+            the request, defaults to the shared rate-limited scheduler.
+        """
+        self.url = url
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.client = client or http_client
+        self.scheduler = scheduler or page_scheduler
+        self._index: MenuIndex | None = None
+        self._etag: str | None = None
+        self._last_modified: str | None = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def fresh(self) -> bool:
+        return self._index is not None and time.monotonic() < self._expires_at
+
+    async def get(self) -> MenuIndex | None:
+        """
+        Returns the menu index, fetching or revalidating it if stale.
+
+        Returns:
+            Optional[MenuIndex]: The menu index or None if the menu
+            has never been fetched successfully.
+        """
+        if not self.fresh:
+            async with self._lock:
+                if not self.fresh:
+                    await self.refresh()
+        return self._index
+
+    async def _request_menu(self, headers: dict[str, str]) -> \
+            tuple[Any, str | None, str | None]:
+        """
+        Requests the menu, raising on failure so that the page scheduler
+        can retry it.
+
+        Args:
+            headers (dict[str, str]): The conditional request headers.
+
+        Returns:
+            tuple[Any, Optional[str], Optional[str]]: The menu tree, None
+            if the cached one is still current, with its ETag and
+            Last-Modified headers.
+        """
+        async with self.client.get(self.url, headers=headers) as response:
+            if response.status == 304:
+                return None, None, None
+            response.raise_for_status()
+            return (await response.json(content_type=None),
+                    response.headers.get('ETag'),
+                    response.headers.get('Last-Modified'))
+
+    async def refresh(self) -> bool:
+        """
+        Revalidates the cached menu with a conditional request, retried
+        by the page scheduler.
+
+        Returns:
+            bool: True if the cached menu is up to date afterwards.
+        """
+        headers = {}
+        if self._index is not None:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+        result = await self.scheduler.fetch(
+            URL(self.url).host, partial(self._request_menu, headers))
+        if result is None:
+            self._expires_at = time.monotonic() + self.retry_interval
+            return False
+        data, etag, last_modified = result
+        if data is not None:
+            self._index = MenuIndex(data)
+            self._etag = etag
+            self._last_modified = last_modified
+            logger.info(f"Main menu cached: {len(self._index.leaves)} leaves")
+        self._expires_at = time.monotonic() + self.ttl
+        return True
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            async with self._lock:
+                await self.refresh()
+            await asyncio.sleep(max(self._expires_at - time.monotonic(), 1))
+
+    def start(self) -> None:
+        """
+        Starts refreshing the menu in the background.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """
+        Stops the background refresh.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,51 @@
+import time
+
+import aiohttp
+
+from metrics_registry import REGISTRY
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'wb_http_request_duration_seconds',
+    'Duration of outgoing HTTP requests by endpoint, the last path '
+    'segment of the URL.', ('host', 'endpoint', 'method', 'status'))
+PAGES = REGISTRY.counter(
+    'wb_parser_pages', 'Catalog pages received.', ('host',))
+PRODUCTS = REGISTRY.counter(
+    'wb_parser_products', 'Catalog products received.', ('host',))
+PAGE_FAILURES = REGISTRY.counter(
+    'wb_parser_page_failures', 'Catalog pages lost after all retries.',
+    ('host',))
+SINGLE_FLIGHT = REGISTRY.counter(
+    'wb_single_flight_calls', 'Parser calls by single-flight outcome: '
+    'leader, merged into an in-flight call or reused.',
+    ('group', 'outcome'))
+
+
+def http_trace_config() -> aiohttp.TraceConfig:
+    """
+    Builds an aiohttp trace hook that records every request in
+    HTTP_REQUEST_DURATION.
+
+    Returns:
+        aiohttp.TraceConfig: The trace config to pass to the session.
+    """
+    async def on_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_end(session, context, params):
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - context.started, host=params.url.host,
+            endpoint=params.url.name, method=params.method,
+            status=params.response.status)
+
+    async def on_exception(session, context, params):
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - context.started, host=params.url.host,
+            endpoint=params.url.name, method=params.method,
+            status=type(params.exception).__name__)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_start)
+    trace_config.on_request_end.append(on_end)
+    trace_config.on_request_exception.append(on_exception)
+    return trace_config
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+
+from parser.http_client import json_loads
+from parser.urls import card_url, image_url
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def extract_product(product: dict) -> bool | dict[str, str | float | int]:
+    """
+    Extracts relevant fields from the product dictionary.
+
+    Args:
+        product (dict): The original product dictionary.
+
+    Returns:
+        dict: A dictionary with the relevant fields, False if the product
+        is out of stock.
+    """
+    if product['totalQuantity'] == 0:
+        return False
+    basic_price = product['sizes'][0]['price']['basic']
+    total_price = product['sizes'][0]['price']['total']
+    discount = round((basic_price - total_price) / basic_price * 100)
+    product_id = product['id']
+    return {
+        'name': product['name'],
+        'brand': product['brand'],
+        'id': product_id,
+        'totalQuantity': product['totalQuantity'],
+        'reviewRating': product['reviewRating'],
+        'price': total_price / 100,
+        'discount': discount,
+        'url': card_url(product_id),
+        'image': image_url(product_id),
+    }
+
+
+def decode_page(body: bytes, extract: bool = False) -> tuple[int, list]:
+    """
+    Decodes a catalog page and optionally extracts its products.
+
+    Module-level so that it can run in a worker process.
+
+    Args:
+        body (bytes): The raw response body.
+        extract (bool): Return extracted products instead of raw ones.
+
+    Returns:
+        tuple[int, list]: The catalog total and the page products.
+
+    Raises:
+        ValueError: If the body is not valid JSON.
+    """
+    data = json_loads(body).get('data', {})
+    products = data.get('products', [])
+    if extract:
+        products = [extract_product(product) for product in products]
+    return data.get('total', 0), products
+
+
+class PageDecoder:
+    """
+    Runs page decoding and product extraction on the event loop or
+    in an executor, so that large crawls do not block the bot.
+
+    In process mode only the raw body goes to the worker and only the
+    extracted fields come back, which keeps the pickling cost low.
+    """
+
+    MODES = ('inline', 'thread', 'process')
+
+    def __init__(self, mode: str = 'inline', workers: int | None = None):
+        """
+        Initializes the PageDecoder.
+
+        Args:
+            mode (str): 'inline', 'thread' or 'process'.
+            workers (Optional[int]): Executor size, defaults to the CPU count.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown parser executor mode: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Executor | None = None
+
+    @classmethod
+    def from_config(cls, value: str | None) -> 'PageDecoder':
+        """
+        Builds a decoder from a 'mode' or 'mode:workers' setting,
+        e.g. 'process:4', falling back to inline decoding.
+
+        Args:
+            value (Optional[str]): The configured mode.
+
+        Returns:
+            PageDecoder: The decoder.
+        """
+        if not value:
+            return cls()
+        mode, _, workers = value.partition(':')
+        try:
+            return cls(mode, int(workers) if workers else None)
+        except ValueError as e:
+            logger.error(f"Invalid parser executor {value!r}: {e}")
+            return cls()
+
+    @property
+    def inline(self) -> bool:
+        return self.mode == 'inline'
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == 'process':
+                # Forking a process that runs an event loop and threads
+                # is unsafe, start clean interpreters instead.
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix='page-decoder')
+        return self._executor
+
+    async def decode_page(self, body: bytes,
+                          extract: bool = False) -> tuple[int, list]:
+        """
+        Decodes a catalog page with the configured executor.
+
+        Args:
+            body (bytes): The raw response body.
+            extract (bool): Return extracted products instead of raw ones.
+
+        Returns:
+            tuple[int, list]: The catalog total and the page products.
+        """
+        if self.inline:
+            return decode_page(body, extract)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), decode_page,
+                                          body, extract)
+
+    def close(self) -> None:
+        """
+        Shuts the executor down, dropping the pages not started yet.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+page_decoder = PageDecoder.from_config(os.getenv('WB_PARSER_EXECUTOR'))
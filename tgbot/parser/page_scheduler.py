@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable
+
+import aiohttp
+
+from parser.http_client import RATE_LIMIT
+from parser.resilience import Resilience, hedged
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter with adaptive slow-down.
+
+    The refill rate is cut on throttling responses and recovers
+    additively on successful requests up to the configured rate.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None,
+                 min_rate: float = 0.5):
+        """
+        Initializes the TokenBucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (Optional[float]): Maximum burst size, defaults to rate.
+            min_rate (float): Lower bound for the adaptive rate.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """
+        Waits until a token is available and takes it.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token if one is available without waiting.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until
+            one becomes available.
+        """
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def slow_down(self, pause: float) -> None:
+        """
+        Halves the rate and blocks the bucket for the given pause.
+
+        Args:
+            pause (float): Seconds during which no token is handed out.
+        """
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0.0
+        self._blocked_until = max(self._blocked_until,
+                                  time.monotonic() + pause)
+
+    def speed_up(self) -> None:
+        """
+        Additively restores the rate after a successful request.
+        """
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class PageScheduler:
+    """
+    Runs page requests through a bounded worker window and per-host
+    token buckets, retrying throttled and failed pages with jittered
+    backoff within a per-host retry budget. Hosts that keep failing are
+    cut off by a circuit breaker, and slow pages are hedged with a
+    second request.
+    """
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, concurrency: int = 4, rate: float = 8.0,
+                 burst: float | None = None, max_retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 30.0,
+                 resilience: Resilience | None = None, hedge: bool = True):
+        """
+        Initializes the PageScheduler.
+
+        Args:
+            concurrency (int): Maximum number of pages in flight per run.
+            rate (float): Requests per second allowed for each host.
+            burst (Optional[float]): Token bucket capacity per host.
+            max_retries (int): Retries per page on 429/5xx
+            and connection errors.
+            backoff (float): Base delay in seconds for exponential backoff.
+            max_backoff (float): Upper bound of a single backoff delay.
+            resilience (Optional[Resilience]): Circuit breakers, retry
+            budgets and latency trackers per host.
+            hedge (bool): Hedge pages slower than the host's usual latency.
+        """
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.resilience = resilience or Resilience()
+        self.hedge = hedge
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def bucket(self, host: str) -> TokenBucket:
+        """
+        Returns the token bucket shared by all requests to the host.
+
+        Args:
+            host (str): The host name.
+
+        Returns:
+            TokenBucket: The host's token bucket.
+        """
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[host] = bucket
+        return bucket
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """
+        Computes the delay before the next attempt, honoring Retry-After.
+
+        Args:
+            error (Exception): The error of the failed attempt.
+            attempt (int): Zero-based number of the failed attempt.
+
+        Returns:
+            float: Delay in seconds.
+        """
+        headers = getattr(error, 'headers', None)
+        retry_after = headers.get('Retry-After') if headers else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+        # Equal jitter keeps the backoff growing while spreading retries
+        # of pages that failed together.
+        return random.uniform(delay / 2, delay)
+
+    async def fetch(self, host: str, call: Callable[[], Awaitable[Any]],
+                    hedge: bool = False) -> Any | None:
+        """
+        Performs a single rate-limited call with retries.
+
+        The rate-limit token is taken by the HTTP client when a request
+        actually goes out, so a call answered from the response cache
+        or by an identical call in flight takes none.
+
+        Args:
+            host (str): The host the call is made to.
+            call (Callable[[], Awaitable[Any]]): Coroutine factory
+            performing the request; it must raise on failure.
+            hedge (bool): Send a second request when the call is slower
+            than the host's usual latency.
+
+        Returns:
+            Optional[Any]: The call result or None if every attempt failed.
+        """
+        bucket = self.bucket(host)
+        breaker = self.resilience.breaker(host)
+        budget = self.resilience.budget(host)
+        latency = self.resilience.latency(host)
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                logger.error(f"Circuit for {host} is open, retrying "
+                             f"allowed in {breaker.retry_in:.1f}s")
+                return None
+            sent = asyncio.Event()
+            started = None
+
+            async def rate_limit():
+                nonlocal started
+                budget.record_request()
+                await bucket.acquire()
+                if started is None:
+                    started = time.monotonic()
+                sent.set()
+
+            hedge_delay = self.resilience.hedge_delay(host) if hedge \
+                else None
+            token = RATE_LIMIT.set(rate_limit)
+            try:
+                if hedge_delay is None:
+                    result = await call()
+                else:
+                    result = await hedged(call, hedge_delay, sent.wait)
+            except aiohttp.ClientResponseError as e:
+                if e.status not in self.RETRY_STATUSES:
+                    breaker.record_success()
+                    logger.error(f"HTTP error occurred: {e}")
+                    return None
+                delay = self._retry_delay(e, attempt)
+                bucket.slow_down(delay)
+                # Throttling is handled by the bucket, the host is alive.
+                if e.status == 429:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                delay = self._retry_delay(e, attempt)
+                error = e
+            except ValueError as e:
+                breaker.record_success()
+                logger.error(f"JSON decode error: {e}")
+                return None
+            else:
+                breaker.record_success()
+                # Cached answers say nothing about the host's latency.
+                if started is not None:
+                    latency.add(time.monotonic() - started)
+                    bucket.speed_up()
+                return result
+            finally:
+                RATE_LIMIT.reset(token)
+            if attempt < self.max_retries:
+                if not budget.can_retry():
+                    logger.error(f"Retry budget for {host} exhausted "
+                                 f"({type(error).__name__}: {error})")
+                    return None
+                logger.warning(f"Request to {host} failed "
+                               f"({type(error).__name__}: {error}), "
+                               f"retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        logger.error(f"Request to {host} failed after "
+                     f"{self.max_retries + 1} attempts "
+                     f"({type(error).__name__}: {error})")
+        return None
+
+    async def run(self, host: str, pages: Iterable[Any],
+                  fetch: Callable[[Any], Awaitable[Any]]
+                  ) -> AsyncIterator[tuple[Any, Any | None]]:
+        """
+        Fetches pages within the concurrency window and yields them
+        as they complete.
+
+        At most `concurrency` finished pages wait for the consumer;
+        workers stall until it catches up, so a slow consumer keeps only
+        a few pages in memory. Closing the generator early cancels the
+        pages still in flight, so callers should wrap it in
+        contextlib.aclosing().
+
+        Args:
+            host (str): The host the pages are requested from.
+            pages (Iterable[Any]): Page keys, e.g. skip offsets.
+            fetch (Callable[[Any], Awaitable[Any]]): Coroutine function
+            fetching one page; it must raise on failure.
+
+        Yields:
+            tuple[Any, Optional[Any]]: The page key and its result,
+            or None if the page failed after all retries.
+        """
+        pending = asyncio.Queue()
+        for page in pages:
+            pending.put_nowait(page)
+        total = pending.qsize()
+        if not total:
+            return
+        workers_count = min(self.concurrency, total)
+        done = asyncio.Queue(maxsize=workers_count)
+
+        async def worker():
+            while not pending.empty():
+                page = pending.get_nowait()
+                try:
+                    result = await self.fetch(host, lambda: fetch(page),
+                                              hedge=self.hedge)
+                except Exception as e:
+                    logger.error(f"Page {page!r} failed: {e!r}")
+                    result = None
+                await done.put((page, result))
+
+        workers = [asyncio.create_task(worker())
+                   for _ in range(workers_count)]
+        try:
+            for _ in range(total):
+                yield await done.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+page_scheduler = PageScheduler(
+    concurrency=int(os.getenv('WB_PAGE_CONCURRENCY', '4')),
+    rate=float(os.getenv('WB_PAGE_RATE', '8')),
+    resilience=Resilience(
+        failure_threshold=int(os.getenv('WB_BREAKER_THRESHOLD', '5')),
+        reset_timeout=float(os.getenv('WB_BREAKER_RESET', '30')),
+        budget_ratio=float(os.getenv('WB_RETRY_BUDGET', '0.2')),
+    ),
+    hedge=os.getenv('WB_PAGE_HEDGE', '1') == '1',
+)
@@ -0,0 +1,348 @@
+import asyncio
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Coroutine
+from dataclasses import dataclass
+from typing import Any, Callable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CoroutineStats:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+
+
+class _TimedCoroutine(Coroutine):
+    """
+    Wraps a task coroutine and adds the thread CPU time of each of its
+    steps to the stats of the coroutine function. Steps of different
+    tasks never overlap on the loop thread, so the time is exact.
+    """
+    __slots__ = ('_coro', '_stats')
+
+    def __init__(self, coro, stats: CoroutineStats):
+        self._coro = coro
+        self._stats = stats
+
+    def send(self, value):
+        started = time.thread_time()
+        try:
+            return self._coro.send(value)
+        finally:
+            self._stats.cpu += time.thread_time() - started
+
+    def throw(self, *args):
+        started = time.thread_time()
+        try:
+            return self._coro.throw(*args)
+        finally:
+            self._stats.cpu += time.thread_time() - started
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self._coro.__await__()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}".replace(';', ',')
+
+
+class CrawlProfile:
+    """
+    Profiles one run on the event loop: wall and CPU time per coroutine
+    function, event-loop lag, stack samples of the loop thread and,
+    optionally, allocation hot spots.
+
+    Time spent in the selector is network waiting, time in coroutine
+    frames is decoding and extraction, so the collapsed stacks show
+    where a slow crawl goes.
+    """
+
+    def __init__(self, name: str, interval: float = 0.005,
+                 lag_interval: float = 0.05, memory: bool = True,
+                 top: int = 20):
+        """
+        Initializes the CrawlProfile.
+
+        Args:
+            name (str): The profiled entry point, used in report names.
+            interval (float): Seconds between stack samples.
+            lag_interval (float): Seconds between event-loop lag probes.
+            memory (bool): Trace allocations with tracemalloc.
+            top (int): Rows per table in the report.
+        """
+        self.name = name
+        self.interval = interval
+        self.lag_interval = lag_interval
+        self.memory = memory
+        self.top = top
+        self.coroutines: dict[str, CoroutineStats] = {}
+        self.stacks: Counter[str] = Counter()
+        self.lags: list[float] = []
+        self.allocations: list[tracemalloc.StatisticDiff] = []
+        self.wall = 0.0
+        self.loop_cpu = 0.0
+        self.process_cpu = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._previous_factory = None
+        self._sampler: threading.Thread | None = None
+        self._lag_task: asyncio.Task | None = None
+        self._stopped = threading.Event()
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._started_tracing = False
+        self._started = (0.0, 0.0, 0.0)
+
+    def _task_factory(self, loop, coro, context=None):
+        name = getattr(coro, '__qualname__', type(coro).__name__)
+        stats = self.coroutines.setdefault(name, CoroutineStats())
+        wrapped = _TimedCoroutine(coro, stats)
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, wrapped, context=context) \
+                if context is not None else \
+                self._previous_factory(loop, wrapped)
+        else:
+            task = asyncio.Task(wrapped, loop=loop, context=context)
+        created = time.perf_counter()
+
+        def done(_):
+            stats.calls += 1
+            stats.wall += time.perf_counter() - created
+
+        task.add_done_callback(done)
+        return task
+
+    def _sample(self, thread_id: int) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            labels = []
+            while frame is not None:
+                # The timing wrappers would otherwise split every stack.
+                if frame.f_code.co_filename != __file__:
+                    labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    async def _probe_lag(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.lags.append(max(0.0, time.perf_counter() - expected))
+
+    def start(self) -> None:
+        """
+        Starts profiling the running event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._lag_task = self._loop.create_task(self._probe_lag())
+        self._previous_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._task_factory)
+        if self.memory:
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+        self._sampler = threading.Thread(
+            target=self._sample, args=(threading.get_ident(),),
+            name=f"profile-{self.name}", daemon=True)
+        self._sampler.start()
+        self._started = (time.perf_counter(), time.thread_time(),
+                         time.process_time())
+
+    def stop(self) -> None:
+        """
+        Stops profiling and restores the event loop.
+        """
+        started_wall, started_loop_cpu, started_process_cpu = self._started
+        self.wall = time.perf_counter() - started_wall
+        self.loop_cpu = time.thread_time() - started_loop_cpu
+        self.process_cpu = time.process_time() - started_process_cpu
+        self._stopped.set()
+        self._sampler.join()
+        self._loop.set_task_factory(self._previous_factory)
+        self._lag_task.cancel()
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__),
+                 tracemalloc.Filter(False, __file__)])
+            self.allocations = snapshot.compare_to(self._snapshot, 'lineno')
+            if self._started_tracing:
+                tracemalloc.stop()
+            self._snapshot = None
+
+    def _lag_quantile(self, q: float) -> float:
+        if not self.lags:
+            return 0.0
+        ordered = sorted(self.lags)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> str:
+        return (f"{self.name}: wall {self.wall:.2f}s, loop CPU "
+                f"{self.loop_cpu:.2f}s, process CPU {self.process_cpu:.2f}s, "
+                f"loop lag p95 {self._lag_quantile(0.95) * 1000:.1f}ms "
+                f"max {max(self.lags, default=0.0) * 1000:.1f}ms")
+
+    def report(self) -> str:
+        """
+        Builds the top-N report of the run.
+
+        Returns:
+            str: The report text.
+        """
+        lines = [self.summary(), '',
+                 f"{'coroutine':<60} {'calls':>7} {'wall s':>9} "
+                 f"{'cpu s':>9} {'cpu %':>6}"]
+        coroutines = sorted(self.coroutines.items(),
+                            key=lambda item: item[1].cpu, reverse=True)
+        for name, stats in coroutines[:self.top]:
+            share = stats.cpu / stats.wall * 100 if stats.wall else 0.0
+            lines.append(f"{name[-60:]:<60} {stats.calls:>7} "
+                         f"{stats.wall:>9.3f} {stats.cpu:>9.3f} "
+                         f"{share:>5.0f}%")
+        untracked = self.loop_cpu - sum(stats.cpu for stats
+                                        in self.coroutines.values())
+        lines.append(f"{'(outside profiled tasks)':<60} {'':>7} {'':>9} "
+                     f"{max(untracked, 0.0):>9.3f}")
+
+        total = sum(self.stacks.values())
+        own: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(';', 1)[-1]] += count
+        lines += ['', f"{'function (own samples)':<70} {'samples':>8} "
+                      f"{'%':>6}"]
+        for label, count in own.most_common(self.top):
+            lines.append(f"{label[-70:]:<70} {count:>8} "
+                         f"{count / total * 100:>5.1f}%")
+
+        if self.allocations:
+            lines += ['', f"{'allocation site':<70} {'KiB':>10} "
+                          f"{'blocks':>8}"]
+            for stat in self.allocations[:self.top]:
+                frame = stat.traceback[0]
+                site = f"{frame.filename}:{frame.lineno}"
+                lines.append(f"{site[-70:]:<70} "
+                             f"{stat.size_diff / 1024:>10.1f} "
+                             f"{stat.count_diff:>8}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory: str) -> str:
+        """
+        Writes the report and the collapsed stacks for flamegraph tools.
+
+        Args:
+            directory (str): The directory for the files.
+
+        Returns:
+            str: The common path prefix of the written files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, f"{self.name}-"
+                                         f"{time.strftime('%Y%m%d-%H%M%S')}-"
+                                         f"{os.getpid()}")
+        with open(f"{prefix}.txt", 'w', encoding='utf-8') as file:
+            file.write(self.report())
+        with open(f"{prefix}.folded", 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        return prefix
+
+
+_active: CrawlProfile | None = None
+
+
+def profiling_enabled(name: str) -> bool:
+    """
+    Checks whether an entry point should be profiled.
+
+    The setting is read from the file named by WB_PROFILE_FILE when that
+    file exists, and from WB_PROFILE otherwise. The file is read on every
+    call, so writing or deleting it switches profiling on or off in a
+    running process. The setting is '1' or 'all' for every entry point,
+    or a comma separated list of entry point names.
+
+    Args:
+        name (str): The entry point name.
+
+    Returns:
+        bool: True if the entry point should be profiled.
+    """
+    setting = os.getenv('WB_PROFILE', '')
+    path = os.getenv('WB_PROFILE_FILE')
+    if path:
+        try:
+            with open(path, encoding='utf-8') as file:
+                setting = file.read()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Could not read {path}: {e}")
+    setting = setting.strip()
+    if setting in ('', '0'):
+        return False
+    return setting in ('1', 'all') or name in \
+        {part.strip() for part in setting.split(',')}
+
+
+def profiled(name: str | None = None) -> Callable:
+    """
+    Decorator profiling an async entry point when profiling_enabled
+    selects it.
+
+    Only one run is profiled at a time; calls made while a profile is
+    active, e.g. parse_all_products inside a profiled crawl, are part
+    of that profile.
+
+    Args:
+        name (Optional[str]): The entry point name, defaults to the
+        function name.
+
+    Returns:
+        Callable: The decorator.
+    """
+    def decorate(function: Callable) -> Callable:
+        entry = name or function.__name__
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs) -> Any:
+            global _active
+            if _active is not None or not profiling_enabled(entry):
+                return await function(*args, **kwargs)
+            profile = _active = CrawlProfile(
+                entry,
+                interval=float(os.getenv('WB_PROFILE_INTERVAL', '0.005')),
+                memory=os.getenv('WB_PROFILE_MEMORY', '1') == '1',
+                top=int(os.getenv('WB_PROFILE_TOP', '20')))
+            profile.start()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                profile.stop()
+                _active = None
+                # A failed report must not replace the run's own result.
+                try:
+                    prefix = profile.write(os.getenv('WB_PROFILE_DIR',
+                                                     'profiles'))
+                except Exception:
+                    logger.exception(f"Writing the profile of {entry} "
+                                     f"failed")
+                else:
+                    logger.info(f"Profile {profile.summary()}, "
+                                f"report in {prefix}.txt")
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,260 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Set while the second request of a hedged call runs, so that layers
+# merging identical requests let it through.
+HEDGE = contextvars.ContextVar('hedge', default=False)
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of the requests made to an endpoint, so
+    that an outage does not multiply the load by the retry count.
+
+    Every request deposits `ratio` of a retry token, every retry
+    withdraws one; a small time-based reserve lets rarely used endpoints
+    retry at all.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve_per_second: float = 1.0,
+                 capacity: float = 50.0):
+        """
+        Initializes the RetryBudget.
+
+        Args:
+            ratio (float): Retry tokens earned per request.
+            reserve_per_second (float): Retry tokens earned per second.
+            capacity (float): Maximum number of saved retry tokens.
+        """
+        self.ratio = ratio
+        self.reserve_per_second = reserve_per_second
+        self.capacity = capacity
+        self._balance = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._balance = min(self.capacity, self._balance + (
+            now - self._updated) * self.reserve_per_second)
+        self._updated = now
+
+    def record_request(self) -> None:
+        self._refill()
+        self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def can_retry(self) -> bool:
+        """
+        Withdraws a retry token if one is left.
+
+        Returns:
+            bool: True if the retry may be made.
+        """
+        self._refill()
+        if self._balance >= 1:
+            self._balance -= 1
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after consecutive failures and
+    lets a single probe through once the reset timeout has passed.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0):
+        """
+        Initializes the CircuitBreaker.
+
+        Args:
+            failure_threshold (int): Consecutive failures opening the circuit.
+            reset_timeout (float): Seconds before a probe is let through.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        """
+        Checks whether a request may be sent now.
+
+        Returns:
+            bool: True if the request may be sent.
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            # A probe that never reported back, e.g. because it was
+            # cancelled, must not keep the circuit half-open forever.
+            now = time.monotonic()
+            if self._probing and now - self._probe_started < \
+                    self.reset_timeout:
+                return False
+            self._probing = True
+            self._probe_started = now
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or \
+                self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit opened after {self.failures} "
+                               f"failures for {self.reset_timeout}s")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    @property
+    def retry_in(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout
+                   - time.monotonic())
+
+
+class LatencyTracker:
+    """
+    Keeps recent request durations to derive the hedging delay.
+    """
+
+    def __init__(self, window: int = 200):
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def add(self, duration: float) -> None:
+        self.samples.append(duration)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Returns the q-quantile of the recent durations.
+
+        Args:
+            q (float): The quantile between 0 and 1.
+
+        Returns:
+            Optional[float]: The duration or None with too few samples.
+        """
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def hedged(call: Callable[[], Awaitable[Any]], delay: float,
+                 sent: Callable[[], Awaitable[Any]] | None = None) -> Any:
+    """
+    Runs a call and, if it has not finished after the delay, a second
+    identical one, returning whichever succeeds first.
+
+    Args:
+        call (Callable[[], Awaitable[Any]]): Coroutine factory making
+        the request.
+        delay (float): Seconds to wait before hedging.
+        sent (Optional[Callable[[], Awaitable[Any]]]): Awaited before the
+        delay starts, e.g. until the call has its rate-limit token; a call
+        finishing before that is never hedged.
+
+    Returns:
+        Any: The result of the first successful call.
+
+    Raises:
+        Exception: The error of the last call if both failed.
+    """
+    first = asyncio.ensure_future(call())
+    tasks = {first}
+    error = None
+    try:
+        if sent is not None:
+            waiter = asyncio.ensure_future(sent())
+            try:
+                await asyncio.wait({first, waiter},
+                                   return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            tasks = set()
+            return first.result()
+        token = HEDGE.set(True)
+        try:
+            tasks.add(asyncio.ensure_future(call()))
+        finally:
+            HEDGE.reset(token)
+        while tasks:
+            done, tasks = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class Resilience:
+    """
+    Per-host circuit breakers, retry budgets and latency trackers.
+    """
+
+    def __init__(self, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, budget_ratio: float = 0.2,
+                 hedge_quantile: float = 0.95):
+        """
+        Initializes the Resilience registry.
+
+        Args:
+            failure_threshold (int): Consecutive failures opening a circuit.
+            reset_timeout (float): Seconds an open circuit rejects requests.
+            budget_ratio (float): Retries allowed per request made.
+            hedge_quantile (float): Latency quantile after which a slow
+            request is hedged.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.budget_ratio = budget_ratio
+        self.hedge_quantile = hedge_quantile
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._budgets: dict[str, RetryBudget] = {}
+        self._latencies: dict[str, LatencyTracker] = {}
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(self.failure_threshold,
+                                                  self.reset_timeout)
+        return self._breakers[host]
+
+    def budget(self, host: str) -> RetryBudget:
+        if host not in self._budgets:
+            self._budgets[host] = RetryBudget(self.budget_ratio)
+        return self._budgets[host]
+
+    def latency(self, host: str) -> LatencyTracker:
+        if host not in self._latencies:
+            self._latencies[host] = LatencyTracker()
+        return self._latencies[host]
+
+    def hedge_delay(self, host: str) -> float | None:
+        return self.latency(host).quantile(self.hedge_quantile)
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlencode
+
+from yarl import URL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+class ResponseCache:
+    """
+    Persistent cache of response bodies in SQLite, shared by every
+    request of the HTTP client and kept across restarts.
+
+    Each endpoint, named by the last segment of the URL path, has its
+    own TTL; endpoints without one are never cached. Bodies are stored
+    zlib-compressed and the least recently used ones are evicted once
+    the cache outgrows its size. An expired body is still served for
+    the stale window while a single background request refreshes it.
+    """
+
+    def __init__(self, path: str, ttls: dict[str, float],
+                 max_bytes: int = 256 * 2 ** 20, stale: float = 600.0,
+                 level: int = 6):
+        """
+        Initializes the ResponseCache; the database is opened on first use.
+
+        Args:
+            path (str): The SQLite database file.
+            ttls (Dict[str, float]): Seconds a response stays fresh,
+            by endpoint name.
+            max_bytes (int): Upper bound of the stored compressed bodies.
+            stale (float): Seconds an expired response may still be served
+            while it is revalidated.
+            level (int): zlib compression level.
+        """
+        self.path = path
+        self.ttls = ttls
+        self.max_bytes = max_bytes
+        self.stale = stale
+        self.level = level
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._db: sqlite3.Connection | None = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_config(cls, path: str | None, ttls: str | None = None,
+                    max_mb: float = 256, stale: float = 600.0
+                    ) -> 'ResponseCache | None':
+        """
+        Builds the cache from its environment settings.
+
+        Args:
+            path (Optional[str]): The database file, None or empty
+            to disable the cache.
+            ttls (Optional[str]): 'endpoint=seconds' pairs separated by
+            commas, e.g. 'catalog=300,filters=1800'.
+            max_mb (float): Upper bound of the cache in megabytes.
+            stale (float): Stale-while-revalidate window in seconds.
+
+        Returns:
+            Optional[ResponseCache]: The cache or None if disabled.
+
+        Raises:
+            ValueError: If a TTL entry is malformed.
+        """
+        if not path:
+            return None
+        parsed = {}
+        for entry in (ttls or '').split(','):
+            if not entry.strip():
+                continue
+            endpoint, _, seconds = entry.partition('=')
+            parsed[endpoint.strip()] = float(seconds)
+        return cls(path, parsed, max_bytes=int(max_mb * 2 ** 20),
+                   stale=stale)
+
+    @staticmethod
+    def key(url: str, params: dict[str, Any] | None = None) -> str:
+        if not params:
+            return url
+        query = sorted((str(name), str(value))
+                       for name, value in params.items())
+        return f"{url}?{urlencode(query)}"
+
+    def ttl(self, url: str) -> float:
+        """
+        Returns the TTL of the URL's endpoint, 0 if it is not cached.
+
+        Args:
+            url (str): The request URL without query.
+
+        Returns:
+            float: The TTL in seconds.
+        """
+        return self.ttls.get(URL(url).name, 0.0)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False,
+                                       isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.executescript(SCHEMA)
+            self._size = self._db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        return self._db
+
+    def _read(self, key: str) -> tuple[bytes, float] | None:
+        with self._lock:
+            db = self._connect()
+            row = db.execute('SELECT body, expires FROM responses '
+                             'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE responses SET accessed = ? WHERE key = ?',
+                       (time.time(), key))
+        return zlib.decompress(row[0]), row[1]
+
+    def _write(self, key: str, body: bytes, ttl: float) -> None:
+        compressed = zlib.compress(body, self.level)
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            previous = db.execute('SELECT size FROM responses WHERE key = ?',
+                                  (key,)).fetchone()
+            db.execute('INSERT OR REPLACE INTO responses '
+                       '(key, body, size, expires, accessed) '
+                       'VALUES (?, ?, ?, ?, ?)',
+                       (key, compressed, len(compressed), now + ttl, now))
+            self._size += len(compressed) - (previous[0] if previous else 0)
+            if self._size > self.max_bytes:
+                self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        # Evict down to 90% so that eviction does not run on every write.
+        target = self.max_bytes * 0.9
+        rows = db.execute('SELECT key, size FROM responses '
+                          'ORDER BY accessed').fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        db.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    async def fetch(self, url: str, params: dict[str, Any] | None,
+                    load: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Returns the cached body of the request, loading and storing it
+        when it is missing or too old.
+
+        Args:
+            url (str): The request URL.
+            params (Optional[Dict[str, Any]]): Query parameters.
+            load (Callable[[], Awaitable[bytes]]): Coroutine factory
+            requesting the body; it must raise on failure.
+
+        Returns:
+            bytes: The response body.
+
+        Raises:
+            aiohttp.ClientError: If the body had to be loaded and the
+            request failed.
+        """
+        ttl = self.ttl(url)
+        if ttl <= 0:
+            return await load()
+        key = self.key(url, params)
+        try:
+            cached = await asyncio.to_thread(self._read, key)
+        except (sqlite3.Error, zlib.error) as e:
+            logger.error(f"Response cache read failed: {e}")
+            cached = None
+        if cached is not None:
+            body, expires = cached
+            now = time.time()
+            if now < expires:
+                self.hits += 1
+                return body
+            if now < expires + self.stale:
+                self.stale_hits += 1
+                self._revalidate(key, ttl, load)
+                return body
+        self.misses += 1
+        body = await load()
+        await self._store(key, body, ttl)
+        return body
+
+    async def _store(self, key: str, body: bytes, ttl: float) -> None:
+        try:
+            await asyncio.to_thread(self._write, key, body, ttl)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache write failed: {e}")
+
+    def _revalidate(self, key: str, ttl: float,
+                    load: Callable[[], Awaitable[bytes]]) -> None:
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._store(key, await load(), ttl)
+            except Exception as e:
+                logger.warning(f"Revalidating {key} failed: {e!r}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def close(self) -> None:
+        """
+        Cancels pending revalidations and closes the database.
+        """
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+response_cache = ResponseCache.from_config(
+    os.getenv('WB_RESPONSE_CACHE', 'wb_responses.sqlite3'),
+    os.getenv('WB_RESPONSE_CACHE_TTLS', 'catalog=300,filters=1800'),
+    max_mb=float(os.getenv('WB_RESPONSE_CACHE_MB', '256')),
+    stale=float(os.getenv('WB_RESPONSE_CACHE_STALE', '600')),
+)
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from parser.metrics import SINGLE_FLIGHT
+from parser.resilience import HEDGE
+
+
+class _Call:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Merges identical concurrent calls into one upstream call whose
+    result is handed to every caller.
+
+    A successful result is also reused for a short window after the
+    call has finished, so that a job starting right after an identical
+    one does not repeat it. Errors are shared by the callers waiting at
+    the time but never reused. Hedged requests bypass the merging,
+    since they are meant to be a second upstream call.
+
+    The upstream call is cancelled once every caller waiting for it has
+    been cancelled, so that abandoned pages and hedge losers stop.
+    """
+
+    def __init__(self, name: str, reuse: float = 1.0,
+                 max_results: int = 1024):
+        """
+        Initializes the SingleFlight.
+
+        Args:
+            name (str): Name of the call group in the metrics.
+            reuse (float): Seconds a result is reused after the call.
+            max_results (int): Maximum number of results kept for reuse.
+        """
+        self.name = name
+        self.reuse = reuse
+        self.max_results = max_results
+        self._inflight: dict[Hashable, _Call] = {}
+        self._results: OrderedDict[Hashable, tuple[float, Any]] = \
+            OrderedDict()
+
+    async def do(self, key: Hashable,
+                 call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs the call unless an identical one is in flight or has just
+        finished, in which case its result is returned.
+
+        Args:
+            key (Hashable): Identifies identical calls.
+            call (Callable[[], Awaitable[Any]]): Coroutine factory making
+            the upstream call.
+
+        Returns:
+            Any: The result of the call.
+        """
+        if HEDGE.get():
+            return await call()
+        entry = self._results.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.monotonic():
+                SINGLE_FLIGHT.inc(group=self.name, outcome='reused')
+                return result
+            del self._results[key]
+
+        flight = self._inflight.get(key)
+        if flight is None:
+            SINGLE_FLIGHT.inc(group=self.name, outcome='leader')
+            flight = _Call(asyncio.ensure_future(self._run(key, call)))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(
+                lambda task: self._finished(key, flight))
+        else:
+            SINGLE_FLIGHT.inc(group=self.name, outcome='merged')
+        flight.waiters += 1
+        try:
+            # The call belongs to every waiter, cancelling one of them
+            # must not cancel it for the others.
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody waits anymore; later callers start a new call
+                # instead of joining the cancelled one.
+                self._forget_call(key, flight)
+                flight.task.cancel()
+
+    def _forget_call(self, key: Hashable, flight: _Call) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def _finished(self, key: Hashable, flight: _Call) -> None:
+        self._forget_call(key, flight)
+        # Mark the error as retrieved even when every waiter is gone.
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    async def _run(self, key: Hashable,
+                   call: Callable[[], Awaitable[Any]]) -> Any:
+        result = await call()
+        if self.reuse > 0 and result is not None:
+            self._results[key] = (time.monotonic() + self.reuse, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result
+
+    def forget(self, key: Hashable | None = None) -> None:
+        """
+        Drops one reusable result or all of them.
+
+        Args:
+            key (Optional[Hashable]): The key to drop, everything if None.
+        """
+        if key is None:
+            self._results.clear()
+        else:
+            self._results.pop(key, None)
+
+
+catalog_flight = SingleFlight(
+    'catalog', reuse=float(os.getenv('WB_SINGLE_FLIGHT_REUSE', '1')))
@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+from typing import Any, NamedTuple, Protocol
+
+
+class ProductState(NamedTuple):
+    price: float
+    discount: int
+    quantity: int
+    rating: float
+
+    def pack(self) -> str:
+        return f"{self.price}|{self.discount}|{self.quantity}|{self.rating}"
+
+    @classmethod
+    def unpack(cls, value: str) -> 'ProductState':
+        price, discount, quantity, rating = value.split('|')
+        return cls(float(price), int(discount), int(quantity), float(rating))
+
+
+def raw_product_state(product: dict[str, Any]) -> ProductState:
+    """
+    Computes the tracked state of a raw catalog product.
+
+    Args:
+        product (dict[str, Any]): The raw product from a catalog page.
+
+    Returns:
+        ProductState: Price, discount, quantity and rating.
+    """
+    basic_price = product['sizes'][0]['price']['basic']
+    total_price = product['sizes'][0]['price']['total']
+    discount = round((basic_price - total_price) / basic_price * 100) \
+        if basic_price else 0
+    return ProductState(total_price / 100, discount,
+                        product['totalQuantity'], product['reviewRating'])
+
+
+@dataclass
+class CatalogChanges:
+    new: list[dict] = field(default_factory=list)
+    price_drops: list[dict] = field(default_factory=list)
+    restocks: list[dict] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    # (price_range, skip) of the pages that failed, see PageCrawl.
+    failed_skips: list[tuple[tuple[int, int] | None, int]] = \
+        field(default_factory=list)
+    complete: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.new or self.price_drops or self.restocks
+                    or self.removed)
+
+
+class SnapshotStore(Protocol):
+    async def load(self, key: str) -> dict[int, ProductState]:
+        ...
+
+    async def save(self, key: str, changed: dict[int, ProductState],
+                   removed: list[int]) -> None:
+        ...
+
+
+class RedisSnapshotStore:
+    """
+    Keeps catalog snapshots in Redis hashes named 'snapshot:<key>'.
+    """
+
+    def __init__(self, db):
+        """
+        Initializes the RedisSnapshotStore.
+
+        Args:
+            db (RedisDB): The Redis database wrapper.
+        """
+        self.db = db
+
+    async def load(self, key: str) -> dict[int, ProductState]:
+        snapshot = await self.db.get_snapshot(f"snapshot:{key}")
+        return {int(product_id): ProductState.unpack(state)
+                for product_id, state in snapshot.items()}
+
+    async def save(self, key: str, changed: dict[int, ProductState],
+                   removed: list[int]) -> None:
+        await self.db.update_snapshot(
+            f"snapshot:{key}",
+            {str(product_id): state.pack()
+             for product_id, state in changed.items()},
+            [str(product_id) for product_id in removed])
+
+
+class MemorySnapshotStore:
+    """
+    Keeps catalog snapshots in process memory.
+    """
+
+    def __init__(self):
+        self.snapshots: dict[str, dict[int, ProductState]] = {}
+
+    async def load(self, key: str) -> dict[int, ProductState]:
+        return dict(self.snapshots.get(key, {}))
+
+    async def save(self, key: str, changed: dict[int, ProductState],
+                   removed: list[int]) -> None:
+        snapshot = self.snapshots.setdefault(key, {})
+        snapshot.update(changed)
+        for product_id in removed:
+            snapshot.pop(product_id, None)
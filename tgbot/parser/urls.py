@@ -0,0 +1,53 @@
+from typing import Iterable
+
+from parser.basket import basket_router
+
+IMAGE_URL = "https://{}/vol{}/part{}/{}/images/big/1.webp"
+
+
+def card_url(product_id: int | str) -> str:
+    """
+    Builds the URL for the product card.
+
+    Args:
+        product_id (int | str): The product ID.
+
+    Returns:
+        str: The URL for the product card.
+    """
+    base_card_url = "https://www.wildberries.ru/catalog/{}/detail.aspx"
+    return base_card_url.format(product_id)
+
+
+def image_url(product_id: int | str, host: str | None = None) -> str:
+    """
+    Builds the URL for the product image.
+
+    Args:
+        product_id (int | str): The product ID.
+        host (Optional[str]): Basket host to use instead of the routed one.
+
+    Returns:
+        str: The URL for the product image.
+    """
+    product_id = int(product_id)
+    return IMAGE_URL.format(host or basket_router.host(product_id),
+                            product_id // 100000, product_id // 1000,
+                            product_id)
+
+
+def image_urls(product_ids: Iterable[int | str]) -> list[str]:
+    """
+    Builds the image URLs for a batch of products.
+
+    Args:
+        product_ids (Iterable[int | str]): The product IDs.
+
+    Returns:
+        list[str]: The URL for each product image.
+    """
+    product_ids = [int(product_id) for product_id in product_ids]
+    return [IMAGE_URL.format(host, product_id // 100000,
+                             product_id // 1000, product_id)
+            for product_id, host in zip(product_ids,
+                                        basket_router.hosts(product_ids))]
@@ -1,28 +1,94 @@
 import asyncio
 import logging
-from typing import Dict, Any
+import math
+import os
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, AsyncIterator, Dict
 
 import aiohttp
+from yarl import URL
+
+from parser.coalescer import DetailCoalescer
+from parser.columns import ProductColumns
 from parser.filter import Filter
+from parser.http_client import HttpClient, http_client
+from parser.metrics import PAGE_FAILURES, PAGES, PRODUCTS
+from parser.page_decoder import PageDecoder, extract_product, page_decoder
+from parser.page_scheduler import PageScheduler, page_scheduler
+from parser.profiling import profiled
+from parser.single_flight import SingleFlight, catalog_flight
+from parser.snapshot import CatalogChanges, SnapshotStore, raw_product_state
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CATALOG_MAX_DEPTH = int(os.getenv('WB_CATALOG_MAX_DEPTH', '10000'))
+PARTITION_CONCURRENCY = int(os.getenv('WB_PARTITION_CONCURRENCY', '4'))
+
+PriceRange = tuple[int, int]
+
+
+@dataclass
+class PageCrawl:
+    """
+    Outcome of one paging run, kept apart from the parser so that
+    concurrent runs on the same parser do not mix their failures.
+
+    Failed pages are recorded as (price_range, skip); the price range
+    is None unless the category was crawled by price range.
+    """
+    failed_skips: list[tuple[PriceRange | None, int]] = \
+        field(default_factory=list)
+    truncated: bool = False
+    partitioned: bool = False
+
 
 class WBParser:
     BASE_URL = 'https://catalog.wb.ru/catalog/{shard}/v2/catalog'
     PRODUCT_DETAIL_URL = 'https://card.wb.ru/cards/v2/detail'
-
-    def __init__(self, shard: str, query: str):
+    DETAIL_BATCH_SIZE = 100
+
+    def __init__(self, shard: str, query: str,
+                 client: HttpClient | None = None,
+                 scheduler: PageScheduler | None = None,
+                 decoder: PageDecoder | None = None,
+                 flight: SingleFlight | None = None,
+                 max_depth: int | None = None,
+                 partition_concurrency: int | None = None):
         """
         Initializes the WBParser with the given shard and query.
 
         Args:
             shard (str): The shard identifier for the catalog.
             query (str): The query string for the catalog.
+            client (Optional[HttpClient]): HTTP client to use, defaults
+            to the shared pooled client.
+            scheduler (Optional[PageScheduler]): Page scheduler to use,
+            defaults to the shared rate-limited scheduler.
+            decoder (Optional[PageDecoder]): Where catalog pages are decoded
+            and extracted, defaults to the WB_PARSER_EXECUTOR setting.
+            flight (Optional[SingleFlight]): Merges identical concurrent
+            requests, defaults to the process-wide catalog group.
+            max_depth (Optional[int]): Skip past which the catalog returns
+            no products; deeper categories are crawled by price range.
+            partition_concurrency (Optional[int]): Price ranges crawled
+            at the same time.
         """
         self.shard = shard
         self.query = query
+        self.client = client or http_client
+        self.scheduler = scheduler or page_scheduler
+        self.decoder = decoder or page_decoder
+        self.flight = flight or catalog_flight
+        self.max_depth = max_depth or CATALOG_MAX_DEPTH
+        self.partition_concurrency = partition_concurrency or \
+            PARTITION_CONCURRENCY
+        self.failed_skips: list[tuple[PriceRange | None, int]] = []
+        self.truncated = False
+        self.catalog_host = URL(self.BASE_URL).host
+        self.detail_host = URL(self.PRODUCT_DETAIL_URL).host
 
     def _build_params(self, skip: int, limit: int,
                       filters: dict[str, str] | None = None) -> dict:
@@ -56,7 +122,8 @@ class WBParser:
     async def __fetch_data(self, url: str,
                            params: Dict[str, str]) -> Any | None:
         """
-        Fetches data from the given URL with specified parameters.
+        Fetches data from the given URL with specified parameters,
+        sharing the request with identical ones made by other parsers.
 
         Args:
             url (str): The URL to fetch data from.
@@ -66,10 +133,9 @@ class WBParser:
             Optional[Dict[str, Any]]: JSON response as a dictionary or None if an error occurs.
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    response.raise_for_status()
-                    return await response.json()
+            return await self.flight.do(
+                (url, tuple(sorted(params.items()))),
+                lambda: self.client.get_json(url, params=params))
         except aiohttp.ClientError as e:
             logger.error(f"HTTP error occurred: {e}")
         except ValueError as e:
@@ -94,6 +160,25 @@ class WBParser:
         return await self.__fetch_data(self.BASE_URL.format(shard=self.shard),
                                        params)
 
+    async def _request_products(self, skip: int, limit: int,
+                                filters: dict[str, str] | None = None) -> \
+            dict[str, Any]:
+        """
+        Requests a catalog page, raising on failure so that the page
+        scheduler can retry it.
+
+        Args:
+            skip (int): Number of items to skip.
+            limit (int): Number of items to fetch.
+            filters (Optional[Dict[str, str]]): Dictionary of filter keys and their values.
+
+        Returns:
+            Dict[str, Any]: JSON response as a dictionary.
+        """
+        params = self._build_params(skip, limit, filters)
+        return await self.client.get_json(
+            self.BASE_URL.format(shard=self.shard), params=params)
+
     async def get_product_details(self, product_id: str) -> dict[
                                                                 str, Any] | None:
         """
@@ -105,15 +190,122 @@ class WBParser:
         Returns:
             Optional[Dict[str, Any]]: JSON response as a dictionary or None if an error occurs.
         """
-        params = {
+        return await self.__fetch_data(self.PRODUCT_DETAIL_URL,
+                                       self._build_detail_params(product_id))
+
+    def _build_detail_params(self, nm: str) -> dict:
+        """
+        Builds the parameters for the product detail request.
+
+        Args:
+            nm (str): A product ID or ';'-separated product IDs.
+
+        Returns:
+            dict: Dictionary of parameters.
+        """
+        return {
             'appType': '1',
             'curr': 'rub',
             'dest': '-5854091',
             'spp': '30',
             'ab_testing': 'false',
-            'nm': product_id
+            'nm': nm
         }
-        return await self.__fetch_data(self.PRODUCT_DETAIL_URL, params)
+
+    async def _request_details(self, product_ids: list[int]) -> \
+            dict[str, Any]:
+        """
+        Requests the details of a batch of products, raising on failure
+        so that the page scheduler can retry it.
+
+        Args:
+            product_ids (List[int]): IDs of the products.
+
+        Returns:
+            Dict[str, Any]: JSON response as a dictionary.
+        """
+        params = self._build_detail_params(';'.join(map(str, product_ids)))
+        return await self.client.get_json(self.PRODUCT_DETAIL_URL,
+                                          params=params)
+
+    async def get_products_details(self, product_ids: list[int | str],
+                                   batch_size: int | None = None) -> \
+            dict[int, dict[str, Any]]:
+        """
+        Fetches the details of many products with multi-ID requests
+        run through the page scheduler.
+
+        Args:
+            product_ids (List[int | str]): IDs of the products.
+            batch_size (Optional[int]): Maximum IDs per request
+            (default is DETAIL_BATCH_SIZE).
+
+        Returns:
+            Dict[int, Dict[str, Any]]: Product details by product ID;
+            products that were not found or whose batch failed are absent.
+        """
+        batch_size = batch_size or self.DETAIL_BATCH_SIZE
+        unique_ids = list(dict.fromkeys(map(int, product_ids)))
+        batches = [unique_ids[i:i + batch_size]
+                   for i in range(0, len(unique_ids), batch_size)]
+        details = {}
+        async with aclosing(self.scheduler.run(self.detail_host, batches,
+                                               self._request_details)) \
+                as results:
+            async for batch, result in results:
+                if not result:
+                    logger.error(f"No details received for {len(batch)} "
+                                 f"products starting with {batch[0]}.")
+                    continue
+                for product in result.get('data', {}).get('products', []):
+                    details[product['id']] = product
+        return details
+
+    @staticmethod
+    def _split_price_range(low: int, high: int,
+                           parts: int) -> list[tuple[int, int]]:
+        """
+        Splits an inclusive price range into adjacent ranges of equal
+        width.
+
+        Args:
+            low (int): The lowest price in kopecks.
+            high (int): The highest price in kopecks.
+            parts (int): The number of ranges wanted.
+
+        Returns:
+            List[Tuple[int, int]]: The inclusive ranges, fewer than parts
+            if the range is too narrow.
+        """
+        parts = max(1, min(parts, high - low + 1))
+        bounds = [low + (high - low + 1) * part // parts
+                  for part in range(parts + 1)]
+        return [(bounds[part], bounds[part + 1] - 1)
+                for part in range(parts)]
+
+    async def _price_bounds(self, filters: dict[str, str] | None) -> \
+            tuple[int, int] | None:
+        """
+        Gets the price range to partition a crawl over: the priceU
+        filter if one is set, otherwise the category price bounds.
+
+        Args:
+            filters (Optional[Dict[str, str]]): Dictionary of filter keys
+            and their values.
+
+        Returns:
+            Optional[Tuple[int, int]]: The inclusive price range in kopecks
+            or None if it is unknown.
+        """
+        if filters and 'priceU' in filters:
+            low, _, high = str(filters['priceU']).partition(';')
+            try:
+                return int(low), int(high)
+            except ValueError:
+                logger.error(f"Invalid priceU filter: {filters['priceU']}")
+                return None
+        return await Filter(self.shard, self.query,
+                            self.client).get_price_range()
 
     async def _get_filter_params(self, filters: list[tuple[
         str, str]] | None = None) -> dict[str, str] | None:
@@ -131,11 +323,11 @@ class WBParser:
         if not filters:
             return None
 
-        filter_instance = Filter(self.shard, self.query)
+        filter_instance = Filter(self.shard, self.query, self.client)
+        resolved = await filter_instance.get_filters_params(filters)
         filter_params = {}
-        for filter_name, filter_value_name in filters:
-            filter_key, filter_id = await filter_instance.get_filter_params(
-                filter_name, filter_value_name)
+        for (filter_name, filter_value_name), (filter_key, filter_id) in \
+                zip(filters, resolved):
             if not filter_key or not filter_id:
                 logger.error(
                     f"Filter '{filter_name}' with value '{filter_value_name}' not found, aborting.")
@@ -143,48 +335,328 @@ class WBParser:
             filter_params[filter_key] = filter_id
         return filter_params
 
-    async def _fetch_all_products(self, filters: dict[str, str] | None,
-                                  limit: int, max_count: int) -> list[dict]:
+    async def _request_page(self, skip: int, limit: int,
+                            filters: dict[str, str] | None = None,
+                            extract: bool = False) -> tuple[int, list]:
         """
-        Fetch all products that match the given filter parameters.
+        Requests and decodes a catalog page, raising on failure so that
+        the page scheduler can retry it.
+
+        Identical pages requested by concurrent parsers are fetched
+        once and shared, so the products must not be modified.
+
+        Args:
+            skip (int): Number of items to skip.
+            limit (int): Number of items to fetch.
+            filters (Optional[Dict[str, str]]): Dictionary of filter keys and their values.
+            extract (bool): Return extracted products instead of raw ones.
+
+        Returns:
+            tuple[int, list]: The catalog total and the page products.
+        """
+        key = (self.shard, self.query, skip, limit,
+               tuple(sorted((filters or {}).items())), extract)
+        return await self.flight.do(key, partial(
+            self._load_page, skip, limit, filters, extract))
+
+    async def _load_page(self, skip: int, limit: int,
+                         filters: dict[str, str] | None,
+                         extract: bool) -> tuple[int, list]:
+        """
+        Loads a catalog page for _request_page().
+
+        With an executor configured the body is decoded, and extracted
+        if asked, off the event loop.
+
+        Args:
+            skip (int): Number of items to skip.
+            limit (int): Number of items to fetch.
+            filters (Optional[Dict[str, str]]): Dictionary of filter keys and their values.
+            extract (bool): Return extracted products instead of raw ones.
+
+        Returns:
+            tuple[int, list]: The catalog total and the page products.
+        """
+        if self.decoder.inline:
+            data = (await self._request_products(skip, limit, filters)
+                    ).get('data', {})
+            products = data.get('products', [])
+            if extract:
+                products = list(map(extract_product, products))
+            return data.get('total', 0), products
+        body = await self.client.get_bytes(
+            self.BASE_URL.format(shard=self.shard),
+            params=self._build_params(skip, limit, filters))
+        return await self.decoder.decode_page(body, extract)
+
+    async def _iter_pages(self, filters: dict[str, str] | None,
+                          limit: int, max_count: int,
+                          extract: bool = False,
+                          crawl: PageCrawl | None = None) -> \
+            AsyncIterator[tuple[int, list]]:
+        """
+        Yields catalog pages in the order their responses arrive.
+
+        The first page is fetched alone to learn the total count, the rest
+        go through the page scheduler. Paging stops once max_count products
+        have been yielded. Pages that failed after all retries are recorded
+        in the crawl.
+
+        Categories deeper than max_depth are crawled by price range instead;
+        the crawl is marked truncated if some products still could not
+        be reached. When the run ends, self.failed_skips and self.truncated
+        are set to those of the crawl.
 
         Args:
             filters (Optional[Dict[str, str]]): Dictionary of filter keys
             and their values.
             limit (int): Number of items to fetch per request.
             max_count (int): Maximum number of items to fetch.
+            extract (bool): Yield extracted products instead of raw ones,
+            False for the out-of-stock ones.
+            crawl (Optional[PageCrawl]): Where the outcome of the run
+            is recorded, for callers that need it.
 
-        Returns:
-            List[dict]: A list of all products.
+        Yields:
+            tuple[int, list]: The page skip and its products.
         """
-        all_products = []
-        skip = 0
-
-        products_data = await self.get_products(skip, limit, filters)
-        if not products_data:
+        crawl = crawl if crawl is not None else PageCrawl()
+        try:
+            async with aclosing(self._crawl_pages(
+                    filters, limit, max_count, extract, crawl)) as pages:
+                async for page in pages:
+                    yield page
+        finally:
+            self._log_failed_skips(crawl)
+            self.failed_skips = crawl.failed_skips
+            self.truncated = crawl.truncated
+
+    async def _crawl_pages(self, filters: dict[str, str] | None,
+                           limit: int, max_count: int, extract: bool,
+                           crawl: PageCrawl) -> \
+            AsyncIterator[tuple[int, list]]:
+        """
+        Does the paging of _iter_pages, recording its outcome in the crawl.
+        """
+        first_page = await self.scheduler.fetch(
+            self.catalog_host,
+            partial(self._request_page, 0, limit, filters, extract))
+        if first_page is None:
+            crawl.failed_skips.append((None, 0))
+            PAGE_FAILURES.inc(host=self.catalog_host)
             logger.error("No products data received.")
-            return all_products
+            return
 
-        total_count = products_data.get('data', {}).get('total', 0)
+        total_count, products = first_page
         if total_count == 0:
             logger.info("No products found in total.")
-            return all_products
+            return
+
+        PAGES.inc(host=self.catalog_host)
+        PRODUCTS.inc(len(products), host=self.catalog_host)
+        if min(total_count, max_count) > self.max_depth:
+            bounds = await self._price_bounds(filters)
+            if bounds is not None:
+                crawl.partitioned = True
+                async with aclosing(self._iter_partitions(
+                        filters, limit, max_count, extract, bounds,
+                        products, crawl)) as pages:
+                    async for page in pages:
+                        yield page
+                return
+            logger.warning(f"No price range for {self.query}, only the "
+                           f"first {self.max_depth} of {total_count} "
+                           f"products can be fetched")
+            crawl.truncated = True
+
+        yield 0, products
+        collected = len(products)
+        if collected >= max_count:
+            return
+
+        skips = range(limit, min(total_count, max_count, self.max_depth),
+                      limit)
+        fetch_page = partial(self._request_page, limit=limit,
+                             filters=filters, extract=extract)
+        async with aclosing(self.scheduler.run(self.catalog_host, skips,
+                                               fetch_page)) as results:
+            async for skip, result in results:
+                if result is None:
+                    crawl.failed_skips.append((None, skip))
+                    PAGE_FAILURES.inc(host=self.catalog_host)
+                    continue
+                _, products = result
+                PAGES.inc(host=self.catalog_host)
+                PRODUCTS.inc(len(products), host=self.catalog_host)
+                yield skip, products
+                collected += len(products)
+                if collected >= max_count:
+                    return
+
+    def _log_failed_skips(self, crawl: PageCrawl) -> None:
+        if not crawl.failed_skips:
+            return
+        crawl.failed_skips.sort(
+            key=lambda failed: (failed[0] or (-1, -1), failed[1]))
+        pages = ', '.join(f"{skip}" if prices is None
+                          else f"{skip} of prices {prices[0]}-{prices[1]}"
+                          for prices, skip in crawl.failed_skips)
+        logger.error(f"{len(crawl.failed_skips)} catalog pages of "
+                     f"{self.query} failed after all retries, skips: "
+                     f"{pages}")
+
+    async def _iter_partitions(self, filters: dict[str, str] | None,
+                               limit: int, max_count: int, extract: bool,
+                               bounds: PriceRange, first_products: list,
+                               crawl: PageCrawl) -> \
+            AsyncIterator[tuple[int, list]]:
+        """
+        Yields the pages of a category deeper than the catalog allows,
+        crawling it as price ranges that each fit under max_depth.
+
+        Ranges holding more than max_depth products are split again
+        before being paged. Up to partition_concurrency ranges are
+        crawled at once, and products already yielded by another range,
+        or by the first page, are dropped. Pages come in completion
+        order under increasing keys; at most partition_concurrency of them
+        wait for the consumer, the ranges block until it catches up.
+
+        Args:
+            filters (Optional[Dict[str, str]]): Dictionary of filter keys
+            and their values.
+            limit (int): Number of items to fetch per request.
+            max_count (int): Maximum number of items to fetch.
+            extract (bool): Yield extracted products instead of raw ones;
+            the out-of-stock ones are dropped.
+            bounds (Tuple[int, int]): The inclusive price range in kopecks.
+            first_products (list): The first page of the whole category.
+            crawl (PageCrawl): Where failed pages are recorded with their
+            price range.
+
+        Yields:
+            tuple[int, list]: A page key and its new products.
+        """
+        # Pages take a slot of room, finished markers do not, so that
+        # a range ending or cancelled never waits on the consumer.
+        queue: asyncio.Queue = asyncio.Queue()
+        room = asyncio.Semaphore(self.partition_concurrency)
+        semaphore = asyncio.Semaphore(self.partition_concurrency)
+        tasks: set[asyncio.Task] = set()
+        finished = object()
+        active = 0
+
+        async def put(products: list) -> None:
+            await room.acquire()
+            queue.put_nowait(products)
+
+        def spawn(low: int, high: int) -> None:
+            nonlocal active
+            active += 1
+            task = asyncio.create_task(crawl_range(low, high))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        async def crawl_range(low: int, high: int) -> None:
+            try:
+                range_filters = {**(filters or {}),
+                                 'priceU': f"{low};{high}"}
+                async with semaphore:
+                    first_page = await self.scheduler.fetch(
+                        self.catalog_host, partial(
+                            self._request_page, 0, limit, range_filters,
+                            extract))
+                if first_page is None:
+                    crawl.failed_skips.append(((low, high), 0))
+                    PAGE_FAILURES.inc(host=self.catalog_host)
+                    logger.error(f"No products data received for prices "
+                                 f"{low}-{high} of {self.query}.")
+                    return
+                total_count, products = first_page
+                if total_count > self.max_depth and high > low:
+                    # Aim at half the depth, prices are rarely spread evenly.
+                    parts = math.ceil(total_count * 2 / self.max_depth)
+                    for sub_low, sub_high in self._split_price_range(
+                            low, high, min(parts, 16)):
+                        spawn(sub_low, sub_high)
+                    return
+                if total_count > self.max_depth:
+                    crawl.truncated = True
+                    logger.warning(f"{total_count} products of {self.query} "
+                                   f"cost {low}, only {self.max_depth} can "
+                                   f"be fetched")
+                await put(products)
+                skips = range(limit, min(total_count, self.max_depth), limit)
+                fetch_page = partial(self._request_page, limit=limit,
+                                     filters=range_filters, extract=extract)
+                async with semaphore:
+                    async with aclosing(self.scheduler.run(
+                            self.catalog_host, skips, fetch_page)) as results:
+                        async for skip, result in results:
+                            if result is None:
+                                crawl.failed_skips.append(((low, high),
+                                                           skip))
+                                PAGE_FAILURES.inc(host=self.catalog_host)
+                                continue
+                            await put(result[1])
+            finally:
+                queue.put_nowait(finished)
+
+        seen = set()
+        collected = 0
+        key = 0
+        await put(first_products)
+        spawn(*bounds)
+        try:
+            while active:
+                products = await queue.get()
+                if products is finished:
+                    active -= 1
+                    continue
+                room.release()
+                if products is not first_products:
+                    PAGES.inc(host=self.catalog_host)
+                    PRODUCTS.inc(len(products), host=self.catalog_host)
+                fresh = [product for product in products
+                         if product and product['id'] not in seen]
+                if not fresh:
+                    continue
+                seen.update(product['id'] for product in fresh)
+                yield key, fresh
+                key += limit
+                collected += len(fresh)
+                if collected >= max_count:
+                    return
+        finally:
+            pending = list(tasks)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
-        products = products_data.get('data', {}).get('products', [])
-        all_products.extend(products)
+    async def _fetch_all_products(self, filters: dict[str, str] | None,
+                                  limit: int, max_count: int,
+                                  extract: bool = False) -> list:
+        """
+        Fetch all products that match the given filter parameters.
 
-        tasks = []
-        for skip in range(limit, min(total_count, max_count), limit):
-            tasks.append(self.get_products(skip, limit, filters))
+        Args:
+            filters (Optional[Dict[str, str]]): Dictionary of filter keys
+            and their values.
+            limit (int): Number of items to fetch per request.
+            max_count (int): Maximum number of items to fetch.
+            extract (bool): Return extracted products instead of raw ones.
 
-        results = await asyncio.gather(*tasks)
-        for result in results:
-            if result:
-                products = result.get('data', {}).get('products', [])
-                all_products.extend(products)
-                if len(all_products) >= max_count:
-                    break
+        Returns:
+            list: A list of all products.
+        """
+        pages = {}
+        async with aclosing(self._iter_pages(filters, limit, max_count,
+                                             extract)) as raw_pages:
+            async for skip, products in raw_pages:
+                pages[skip] = products
 
+        all_products = []
+        for skip in sorted(pages):
+            all_products.extend(pages[skip])
         return all_products[:max_count]
 
     def _extract_relevant_fields(self, product: dict) -> bool | dict[
@@ -198,109 +670,231 @@ class WBParser:
         Returns:
             dict: A dictionary with the relevant fields.
         """
-        if product['totalQuantity'] == 0:
-            return False
-        basic_price = product['sizes'][0]['price']['basic']
-        total_price = product['sizes'][0]['price']['total']
-        discount = round((basic_price - total_price) / basic_price * 100)
-        product_id = product['id']
-        return {
-            'name': product['name'],
-            'brand': product['brand'],
-            'id': product_id,
-            'totalQuantity': product['totalQuantity'],
-            'reviewRating': product['reviewRating'],
-            'price': total_price / 100,
-            'discount': discount,
-            'url': self.__get_card_url(product_id),
-            'image': self.__get_product_image(product_id),
-        }
+        return extract_product(product)
 
-    def __get_card_url(self, product_id: str) -> str:
+    @profiled()
+    async def parse_all_products(self,
+                                 filters: list[tuple[str, str]] | None = None,
+                                 limit: int = 100, max_count: int = 1000) -> \
+            list[dict]:
         """
-        Builds the URL for the product card.
+        Parse all in-stock products that match the given filters.
+
+        Pages that still fail after all retries are missing from the
+        result; the pages that failed in the last finished run are left
+        in self.failed_skips.
 
         Args:
-            product_id (str): The product ID.
+            filters (Optional[List[Tuple[str, str]]]): A list of tuples
+            containing filter names and filter value names.
+            limit (int): Number of items to fetch per request (default is 100).
+            max_count (int): Maximum number of items to fetch (default is 1000).
 
         Returns:
-            str: The URL for the product card.
+            List[dict]: A list of all products that match the given filters.
         """
-        base_card_url = "https://www.wildberries.ru/catalog/{}/detail.aspx"
-        return base_card_url.format(product_id)
-
-    def __get_product_image(self, product_id: int) -> str:
+        filter_params = await self._get_filter_params(filters)
+        products = await self._fetch_all_products(filter_params, limit,
+                                                  max_count, extract=True)
+        return [product for product in products if product]
+
+    async def parse_best_products(self, count: int = 10,
+                                  filters: list[tuple[str, str]] | None = None,
+                                  key: str = 'score',
+                                  min_discount: int | None = None,
+                                  max_price: float | None = None,
+                                  min_rating: float | None = None,
+                                  limit: int = 100, max_count: int = 1000) -> \
+            list[dict]:
         """
-        Builds the URL for the product image.
+        Picks the best in-stock products of the category, ranking whole
+        pages as columns instead of extracting every product.
 
         Args:
-            product_id (str): The product ID.
-            root_id (str): The root ID of the product.
+            count (int): Number of products to return.
+            filters (Optional[List[Tuple[str, str]]]): A list of tuples
+            containing filter names and filter value names.
+            key (str): 'score' (discount times rating), 'discount'
+            or 'rating'.
+            min_discount (Optional[int]): Lowest discount in percent.
+            max_price (Optional[float]): Highest price in rubles.
+            min_rating (Optional[float]): Lowest review rating.
+            limit (int): Number of items to fetch per request (default is 100).
+            max_count (int): Maximum number of items to fetch (default is 1000).
 
         Returns:
-            str: The URL for the product image.
-        """
-        product_id_str = str(product_id)
-        k = len(product_id_str) - 5
-        e = int(product_id[:k])
-        match e:
-            case e if e <= 143:
-                t = "01"
-            case e if e <= 287:
-                t = "02"
-            case e if e <= 431:
-                t = "03"
-            case e if e <= 719:
-                t = "04"
-            case e if e <= 1007:
-                t = "05"
-            case e if e <= 1061:
-                t = "06"
-            case e if e <= 1115:
-                t = "07"
-            case e if e <= 1169:
-                t = "08"
-            case e if e <= 1313:
-                t = "09"
-            case e if e <= 1601:
-                t = "10"
-            case e if e <= 1655:
-                t = "11"
-            case e if e <= 1919:
-                t = "12"
-            case e if e <= 2045:
-                t = "13"
-            case e if e <= 2189:
-                t = "14"
-            case e if e <= 2405:
-                t = "15"
-            case e if e <= 2621:
-                t = "16"
-            case _:
-                t = "17"
-
-        basket_host = f"basket-{t}.wbbasket.ru"
-        base_image_url = "https://{}/vol{}/part{}/{}/images/big/1.webp"
-        return base_image_url.format(basket_host, product_id[:k],
-                                     product_id[:k + 2], product_id)
+            List[dict]: The best products, best first.
+        """
+        filter_params = await self._get_filter_params(filters)
+        products = await self._fetch_all_products(filter_params, limit,
+                                                  max_count)
+        columns = ProductColumns.from_products(products).filter(
+            min_discount=min_discount, max_price=max_price,
+            min_rating=min_rating)
+        return columns.top_k(count, key).to_dicts()
+
+    async def iter_pages(self, filters: list[tuple[str, str]] | None = None,
+                         limit: int = 100, max_count: int = 1000) -> \
+            AsyncIterator[list[dict]]:
+        """
+        Yields extracted products page by page as each response arrives.
 
-    async def parse_all_products(self,
-                                 filters: list[tuple[str, str]] | None = None,
-                                 limit: int = 100, max_count: int = 1000) -> \
-            list[dict]:
+        Pages come in completion order, not catalog order. Out-of-stock
+        products are skipped. Stopping the iteration early cancels the
+        pages still in flight, so wrap the call in contextlib.aclosing()
+        when breaking out of the loop.
+
+        Args:
+            filters (Optional[List[Tuple[str, str]]]): A list of tuples
+            containing filter names and filter value names.
+            limit (int): Number of items to fetch per request (default is 100).
+            max_count (int): Maximum number of items to fetch (default is 1000).
+
+        Yields:
+            List[dict]: The extracted products of one catalog page.
+        """
+        filter_params = await self._get_filter_params(filters)
+        remaining = max_count
+        async with aclosing(self._iter_pages(filter_params, limit, max_count,
+                                             extract=True)) as pages:
+            async for _, products in pages:
+                products = products[:remaining]
+                remaining -= len(products)
+                page = [extracted for extracted in products if extracted]
+                if page:
+                    yield page
+                if remaining <= 0:
+                    return
+
+    async def iter_products(self,
+                            filters: list[tuple[str, str]] | None = None,
+                            limit: int = 100, max_count: int = 1000) -> \
+            AsyncIterator[dict]:
+        """
+        Yields extracted products one by one while later pages
+        are still being fetched.
+
+        Args:
+            filters (Optional[List[Tuple[str, str]]]): A list of tuples
+            containing filter names and filter value names.
+            limit (int): Number of items to fetch per request (default is 100).
+            max_count (int): Maximum number of items to fetch (default is 1000).
+
+        Yields:
+            dict: An extracted product.
         """
-        Parse all products that match the given filters.
+        async with aclosing(self.iter_pages(filters, limit,
+                                            max_count)) as pages:
+            async for page in pages:
+                for product in page:
+                    yield product
+
+
+    def _snapshot_key(self, filters: dict[str, str] | None = None) -> str:
+        """
+        Builds the snapshot key of the category and filter parameters.
 
         Args:
+            filters (Optional[Dict[str, str]]): Dictionary of filter keys
+            and their values.
+
+        Returns:
+            str: The snapshot key.
+        """
+        key = f"{self.shard}:{self.query}"
+        if filters:
+            key += ':' + '&'.join(f"{name}={value}" for name, value
+                                  in sorted(filters.items()))
+        return key
+
+    async def parse_changes(self, store: SnapshotStore,
+                            filters: list[tuple[str, str]] | None = None,
+                            limit: int = 100, max_count: int = 1000,
+                            stop_when_unchanged: bool = False) -> \
+            CatalogChanges:
+        """
+        Parses the category and compares it with the stored snapshot,
+        returning only new products, price drops, restocks and removed
+        products. The snapshot is updated with the observed states.
+
+        Removed products are only reported when the whole category was
+        seen, i.e. paging was not stopped early or cut by max_count and
+        no page failed.
+
+        Args:
+            store (SnapshotStore): Where the category snapshot is kept.
             filters (Optional[List[Tuple[str, str]]]): A list of tuples
             containing filter names and filter value names.
             limit (int): Number of items to fetch per request (default is 100).
             max_count (int): Maximum number of items to fetch (default is 1000).
+            stop_when_unchanged (bool): Stop paging at the first page
+            whose products all match the snapshot, which under
+            sort=popular means the rest is most likely unchanged too.
+            Pages arrive in completion order, so paging only stops once
+            every page before it has been received or has failed. Not
+            applied to categories crawled by price range.
 
         Returns:
-            List[dict]: A list of all products that match the given filters.
+            CatalogChanges: The detected changes.
         """
         filter_params = await self._get_filter_params(filters)
-        products = await self._fetch_all_products(filter_params, limit,
-                                                  max_count)
-        return [self._extract_relevant_fields(product) for product in products]
+        key = self._snapshot_key(filter_params)
+        snapshot = await store.load(key)
+        changes = CatalogChanges()
+        changed = {}
+        seen = set()
+        stopped = False
+        crawl = PageCrawl()
+        received = set()
+        unchanged_skip = None
+        async with aclosing(self._iter_pages(filter_params, limit, max_count,
+                                             crawl=crawl)) as raw_pages:
+            async for skip, products in raw_pages:
+                received.add(skip)
+                page_changed = False
+                for product in products:
+                    product_id = product['id']
+                    seen.add(product_id)
+                    state = raw_product_state(product)
+                    old_state = snapshot.get(product_id)
+                    if state == old_state:
+                        continue
+                    page_changed = True
+                    changed[product_id] = state
+                    if not state.quantity:
+                        continue
+                    if old_state is None:
+                        changes.new.append(
+                            self._extract_relevant_fields(product))
+                    elif not old_state.quantity:
+                        changes.restocks.append(
+                            self._extract_relevant_fields(product))
+                    elif state.price < old_state.price:
+                        extracted = self._extract_relevant_fields(product)
+                        extracted['old_price'] = old_state.price
+                        changes.price_drops.append(extracted)
+                if stop_when_unchanged and not crawl.partitioned \
+                        and products and not page_changed \
+                        and (unchanged_skip is None or skip < unchanged_skip):
+                    unchanged_skip = skip
+                if unchanged_skip is not None:
+                    failed = {failed_skip for _, failed_skip
+                              in crawl.failed_skips}
+                    if all(earlier in received or earlier in failed
+                           for earlier in range(0, unchanged_skip, limit)):
+                        stopped = True
+                        break
+
+        changes.failed_skips = list(crawl.failed_skips)
+        changes.complete = not stopped and not changes.failed_skips \
+            and not crawl.truncated and 0 < len(seen) < max_count
+        if changes.complete:
+            changes.removed = [product_id for product_id in snapshot
+                               if product_id not in seen]
+        await store.save(key, changed, changes.removed)
+        return changes
+
+
+detail_coalescer = DetailCoalescer(
+    WBParser(shard='', query='').get_products_details,
+    max_batch=WBParser.DETAIL_BATCH_SIZE)
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+import aiohttp
+
+from parser.basket import BasketRouter, basket_router
+from parser.http_client import HttpClient, http_client
+from parser.urls import image_url
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ImageChecker:
+    """
+    Checks product images with concurrent HEAD requests.
+
+    Every product's image is checked on the host serving its volume.
+    When the routed basket host does not serve a volume, the neighbouring
+    hosts are probed, and the host that answers is remembered per volume
+    in a TTL and LRU bounded cache so that later products of the same
+    volume are checked there directly, without probing again.
+    """
+
+    def __init__(self, client: HttpClient | None = None,
+                 router: BasketRouter | None = None,
+                 build_url: Callable[[int, str], str] = image_url,
+                 ttl: float = 3600.0, max_size: int = 4096,
+                 max_shift: int = 2):
+        """
+        Initializes the ImageChecker.
+
+        Args:
+            client (Optional[HttpClient]): Shared HTTP client.
+            router (Optional[BasketRouter]): Router giving the computed host.
+            build_url (Callable[[int, str], str]): Builds the image URL
+            of a product on a given host.
+            ttl (float): Seconds a resolved volume host is trusted.
+            max_size (int): Maximum number of cached volumes.
+            max_shift (int): How many hosts on each side of the computed
+            one are tried.
+        """
+        self.client = client or http_client
+        self.router = router or basket_router
+        self.build_url = build_url
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_shift = max_shift
+        self._hosts: OrderedDict[int, tuple[float, str]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def cached_host(self, vol: int) -> str | None:
+        entry = self._hosts.get(vol)
+        if entry is None:
+            return None
+        expires_at, host = entry
+        if expires_at <= time.monotonic():
+            del self._hosts[vol]
+            return None
+        self._hosts.move_to_end(vol)
+        return host
+
+    def remember(self, vol: int, host: str) -> None:
+        self._hosts[vol] = (time.monotonic() + self.ttl, host)
+        self._hosts.move_to_end(vol)
+        while len(self._hosts) > self.max_size:
+            self._hosts.popitem(last=False)
+
+    def invalidate(self, vol: int | None = None) -> None:
+        """
+        Drops one cached volume or the whole cache.
+
+        Args:
+            vol (Optional[int]): The volume to drop, everything if None.
+        """
+        if vol is None:
+            self._hosts.clear()
+        else:
+            self._hosts.pop(vol, None)
+
+    async def head(self, url: str) -> bool:
+        """
+        Checks that a URL answers with a success status.
+
+        Args:
+            url (str): The URL to check.
+
+        Returns:
+            bool: True if the URL is accessible.
+        """
+        try:
+            async with self.client.request('HEAD', url) as response:
+                return response.status < 400
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Image check for {url} failed: {e}")
+            return False
+
+    def _neighbours(self, vol: int) -> list[str]:
+        number = self.router.host_number(vol)
+        numbers = []
+        for shift in range(1, self.max_shift + 1):
+            numbers += [number - shift, number + shift]
+        return [self.router.host_name(n) for n in numbers
+                if 0 < n <= self.router.host_count + self.max_shift]
+
+    def _candidates(self, vol: int, tried: str) -> list[str]:
+        computed = self.router.host_name(self.router.host_number(vol))
+        return [host for host in [computed, *self._neighbours(vol)]
+                if host != tried]
+
+    async def _check(self, products: dict[int, list[int]],
+                     hosts: dict[int, str]) -> dict[int, str]:
+        checks = [(product_id, self.build_url(product_id, hosts[vol]))
+                  for vol, ids in products.items() for product_id in ids]
+        results = await asyncio.gather(*(self.head(url)
+                                         for _, url in checks))
+        return {product_id: url
+                for (product_id, url), ok in zip(checks, results) if ok}
+
+    async def resolve(self, product_ids: Iterable[int | str]) -> \
+            dict[int, str | None]:
+        """
+        Finds a working image URL for each product.
+
+        Each product is checked with its own HEAD request, so a URL is
+        only returned for an image that answered. Products are checked
+        in one parallel round on the cached host of their volume, or on
+        the computed one. Volumes where no product answered are then
+        probed on the other hosts with one product each, and their
+        remaining products are checked on the host that was found.
+
+        Args:
+            product_ids (Iterable[int | str]): The product IDs.
+
+        Returns:
+            dict[int, Optional[str]]: The image URL by product ID, None
+            for products without an accessible image.
+        """
+        product_ids = list(dict.fromkeys(map(int, product_ids)))
+        by_vol: dict[int, list[int]] = {}
+        for product_id in product_ids:
+            by_vol.setdefault(product_id // 100000, []).append(product_id)
+        hosts = {vol: self.cached_host(vol) or self.router.host_name(
+            self.router.host_number(vol)) for vol in by_vol}
+        urls = await self._check(by_vol, hosts)
+
+        found = {vol: hosts[vol] for vol, ids in by_vol.items()
+                 if any(product_id in urls for product_id in ids)}
+        missing = [vol for vol in by_vol if vol not in found]
+        probes = [(vol, host) for vol in missing
+                  for host in self._candidates(vol, hosts[vol])]
+        results = await asyncio.gather(
+            *(self.head(self.build_url(by_vol[vol][0], host))
+              for vol, host in probes))
+        for (vol, host), ok in zip(probes, results):
+            # Probes are ordered nearest first, keep the nearest hit.
+            if ok and vol not in found:
+                found[vol] = host
+                urls[by_vol[vol][0]] = self.build_url(by_vol[vol][0], host)
+                logger.info(f"Images of vol{vol} are served by {host} "
+                            f"instead of {hosts[vol]}.")
+        urls.update(await self._check(
+            {vol: by_vol[vol][1:] for vol in missing if vol in found},
+            found))
+
+        for vol in by_vol:
+            if vol in found:
+                self.remember(vol, found[vol])
+            else:
+                self.invalidate(vol)
+        return {product_id: urls.get(product_id)
+                for product_id in product_ids}
+
+
+image_checker = ImageChecker(
+    ttl=float(os.getenv('WB_IMAGE_HOST_TTL', '3600')),
+    max_size=int(os.getenv('WB_IMAGE_HOST_CACHE_SIZE', '4096')),
+)
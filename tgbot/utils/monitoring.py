@@ -0,0 +1,173 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+from aiohttp import web
+from apscheduler.events import (EVENT_JOB_ERROR, EVENT_JOB_EXECUTED,
+                                EVENT_JOB_SUBMITTED, JobEvent)
+
+from metrics_registry import REGISTRY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UPDATE_DURATION = REGISTRY.histogram(
+    'bot_update_duration_seconds', 'Time spent handling an update.',
+    ('event', 'status'))
+HANDLER_DURATION = REGISTRY.histogram(
+    'bot_handler_duration_seconds', 'Time spent in a handler.',
+    ('router', 'handler', 'status'))
+JOB_DURATION = REGISTRY.histogram(
+    'scheduler_job_duration_seconds', 'Duration of scheduled jobs.',
+    ('job', 'status'), buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600))
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Outer dispatcher middleware timing every update by event type.
+    """
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, dict[str, Any]],
+                                         Awaitable[Any]],
+                       event: TelegramObject, data: dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - started,
+                                    event=getattr(event, 'event_type',
+                                                  type(event).__name__),
+                                    status=status)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner router middleware timing every handler call.
+    """
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, dict[str, Any]],
+                                         Awaitable[Any]],
+                       event: TelegramObject, data: dict[str, Any]) -> Any:
+        router = data.get('event_router')
+        handler_object = data.get('handler')
+        callback = getattr(handler_object, 'callback', None)
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            HANDLER_DURATION.observe(
+                time.perf_counter() - started,
+                router=router.name if router else '',
+                handler=getattr(callback, '__name__', ''), status=status)
+
+
+def instrument_dispatcher(dp: Dispatcher) -> None:
+    """
+    Times updates and handlers without changing any handler. Inner
+    middlewares of the dispatcher also run for its included routers.
+
+    Args:
+        dp (Dispatcher): The dispatcher.
+    """
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    middleware = HandlerMetricsMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ('update', 'error'):
+            observer.middleware(middleware)
+
+
+def instrument_scheduler(scheduler) -> None:
+    """
+    Records the duration of every APScheduler job run.
+
+    Args:
+        scheduler (BaseScheduler): The scheduler.
+    """
+    started: dict[tuple[str, Any], float] = {}
+
+    def listener(event: JobEvent) -> None:
+        if event.code == EVENT_JOB_SUBMITTED:
+            # Submission carries a list of run times, execution a single
+            # one; key both by the first run time.
+            key = (event.job_id, event.scheduled_run_times[0])
+            started[key] = time.perf_counter()
+            return
+        key = (event.job_id, event.scheduled_run_time)
+        began = started.pop(key, None)
+        if began is not None:
+            JOB_DURATION.observe(
+                time.perf_counter() - began, job=event.job_id,
+                status='error' if event.code == EVENT_JOB_ERROR else 'ok')
+
+    scheduler.add_listener(listener, EVENT_JOB_SUBMITTED
+                           | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+
+def instrument_send_queue(send_queue) -> None:
+    """
+    Exposes the send queue depth and latency as gauges and its sent
+    and failed messages as counters.
+
+    Args:
+        send_queue (SendQueue): The send queue.
+    """
+    REGISTRY.gauge('send_queue_depth', 'Messages waiting to be sent.',
+                   function=lambda: send_queue.depth)
+    REGISTRY.counter('send_queue_sent', 'Messages sent.',
+                     function=lambda: send_queue.sent)
+    REGISTRY.counter('send_queue_failed', 'Messages that failed to send.',
+                     function=lambda: send_queue.failed)
+    REGISTRY.gauge('send_queue_latency_p95_seconds',
+                   'p95 time from enqueue to delivery.',
+                   function=lambda: send_queue.stats()['latency_p95'])
+
+
+class MetricsServer:
+    """
+    Serves the metrics registry on a local /metrics endpoint.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9100):
+        """
+        Initializes the MetricsServer.
+
+        Args:
+            host (str): The interface to listen on.
+            port (int): The port to listen on.
+        """
+        self.host = host
+        self.port = port
+        self._runner: web.AppRunner | None = None
+
+    @staticmethod
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=REGISTRY.render().encode(), headers={
+            'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def start(self) -> None:
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics served on http://{self.host}:{self.port}"
+                    f"/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,246 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Awaitable, Callable
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from parser.page_scheduler import TokenBucket
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PRIORITY_ADMIN = 0
+PRIORITY_USER = 1
+PRIORITY_CHANNEL = 2
+
+
+@dataclass(order=True)
+class SendJob:
+    priority: int
+    seq: int
+    chat_id: int | str = field(compare=False)
+    call: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued: float = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class SendQueue:
+    """
+    Central outbound queue for Telegram messages.
+
+    Jobs are sent in priority order by a pool of workers, bounded by a
+    global token bucket and a token bucket per chat. A job whose chat
+    bucket is empty is put aside until it refills, so one busy chat does
+    not hold back the others. RetryAfter errors pause the chat and
+    resend the job.
+    """
+
+    def __init__(self, bot, global_rate: float = 30,
+                 private_rate: float = 1, group_rate: float = 20 / 60,
+                 workers: int = 4, max_retries: int = 3,
+                 max_chats: int = 10_000, latency_window: int = 1000):
+        """
+        Initializes the SendQueue.
+
+        Args:
+            bot (Bot): The bot used by send_message and send_photo.
+            global_rate (float): Messages per second across all chats.
+            private_rate (float): Messages per second to one user.
+            group_rate (float): Messages per second to one group or channel.
+            workers (int): Number of concurrent senders.
+            max_retries (int): RetryAfter retries before a job fails.
+            max_chats (int): Number of per-chat buckets kept in memory.
+            latency_window (int): Number of recent send latencies kept
+            for the metrics.
+        """
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+        self._chat_buckets: OrderedDict[int | str, TokenBucket] = \
+            OrderedDict()
+        self._queue: asyncio.PriorityQueue[SendJob] = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._deferred: dict[int, tuple[SendJob, asyncio.TimerHandle]] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        """
+        Starts the sender workers.
+        """
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker())
+                           for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """
+        Sends what is queued within the timeout, then stops the workers
+        and cancels the jobs left.
+
+        Args:
+            timeout (float): Seconds to wait for the queue to drain.
+        """
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._drain(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Send queue stopped with {self.depth} "
+                               f"messages left.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job, handle in self._deferred.values():
+            handle.cancel()
+            job.future.cancel()
+        self._deferred.clear()
+        while not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
+            self._queue.task_done()
+
+    async def _drain(self) -> None:
+        while self.depth:
+            await self._queue.join()
+            if self._deferred:
+                await asyncio.sleep(0.05)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() + len(self._deferred)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Returns the queue metrics.
+
+        Returns:
+            dict[str, float]: Queue depth, sent, failed and retried counts,
+            and the p50/p95 latency in seconds from enqueue to delivery.
+        """
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1,
+                                 round(q * (len(latencies) - 1)))]
+
+        return {
+            'depth': self.depth,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'latency_p50': percentile(0.5),
+            'latency_p95': percentile(0.95),
+        }
+
+    def submit(self, chat_id: int | str, call: Callable[[], Awaitable[Any]],
+               priority: int = PRIORITY_USER) -> asyncio.Future:
+        """
+        Queues a Telegram call addressed to a chat.
+
+        Args:
+            chat_id (int | str): The chat the call sends to.
+            call (Callable[[], Awaitable]): Coroutine function making the call.
+            priority (int): The lane, lower values are sent first.
+
+        Returns:
+            asyncio.Future: Resolves to the call result once it was sent.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(SendJob(priority, next(self._seq), chat_id,
+                                       call, future, time.monotonic()))
+        return future
+
+    def send_message(self, chat_id: int | str, text: str,
+                     priority: int = PRIORITY_USER,
+                     **kwargs) -> asyncio.Future:
+        return self.submit(chat_id, partial(self.bot.send_message, chat_id,
+                                            text, **kwargs), priority)
+
+    def send_photo(self, chat_id: int | str, photo: Any,
+                   priority: int = PRIORITY_USER,
+                   **kwargs) -> asyncio.Future:
+        return self.submit(chat_id, partial(self.bot.send_photo, chat_id,
+                                            photo, **kwargs), priority)
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate if is_group
+                                 else self.private_rate, capacity=1,
+                                 min_rate=self.group_rate / 4)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _defer(self, job: SendJob, delay: float) -> None:
+        handle = asyncio.get_running_loop().call_later(delay, self._resume,
+                                                       job.seq)
+        self._deferred[job.seq] = (job, handle)
+
+    def _resume(self, seq: int) -> None:
+        job, _ = self._deferred.pop(seq)
+        self._queue.put_nowait(job)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.future.cancelled():
+                    continue
+                wait = self._chat_bucket(job.chat_id).try_acquire()
+                if wait:
+                    self._defer(job, wait)
+                    continue
+                await self.global_bucket.acquire()
+                await self._deliver(job)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, job: SendJob) -> None:
+        try:
+            result = await job.call()
+        except TelegramRetryAfter as e:
+            job.attempts += 1
+            self._chat_bucket(job.chat_id).slow_down(e.retry_after)
+            if job.attempts <= self.max_retries:
+                self.retried += 1
+                logger.warning(f"Telegram asked to retry chat {job.chat_id} "
+                               f"after {e.retry_after}s.")
+                self._defer(job, e.retry_after)
+                return
+            self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self._chat_bucket(job.chat_id).speed_up()
+            self.sent += 1
+            self.latencies.append(time.monotonic() - job.enqueued)
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _fail(self, job: SendJob, error: Exception) -> None:
+        self.failed += 1
+        logger.error(f"Failed to send to chat {job.chat_id}: {error}")
+        if not job.future.done():
+            job.future.set_exception(error)
+            # Fire-and-forget callers never await the future; the error
+            # is logged above, so mark it as retrieved.
+            job.future.exception()
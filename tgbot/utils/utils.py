@@ -1,5 +1,15 @@
+from tgbot.utils.images import image_checker
+
+
 async def check_image_url(url: str) -> bool:
     """Check if the image URL is accessible."""
+    return await image_checker.head(url)
+
+
+async def check_image_urls(product_ids: list[int | str]) -> \
+        dict[int, str | None]:
+    """Resolve accessible image URLs for a batch of products."""
+    return await image_checker.resolve(product_ids)
 
 
 async def post_product():
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from parser.snapshot import ProductState, raw_product_state
+from parser.urls import card_url
+from parser.wb_parser import WBParser
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PRICE_RE = re.compile(r'^(?:price|цена)<(\d+(?:[.,]\d+)?)$')
+DISCOUNT_RE = re.compile(r'^(?:discount|скидка)>(\d+)$')
+STOCK_WORDS = {'stock', 'наличие'}
+PRODUCT_ID_RE = re.compile(r'(?:catalog/)?(\d{4,})')
+
+
+@dataclass(frozen=True)
+class WatchCondition:
+    price_below: float | None = None
+    discount_above: int | None = None
+    back_in_stock: bool = False
+
+    @classmethod
+    def parse(cls, tokens: list[str]) -> 'WatchCondition':
+        """
+        Parses watch thresholds typed by a user, e.g.
+        ['price<1500', 'discount>30', 'stock'].
+
+        Args:
+            tokens (List[str]): The threshold tokens.
+
+        Returns:
+            WatchCondition: The parsed condition.
+
+        Raises:
+            ValueError: If a token is not understood or no threshold is set.
+        """
+        price_below, discount_above, back_in_stock = None, None, False
+        for token in tokens:
+            token = token.lower().replace(' ', '')
+            if match := PRICE_RE.match(token):
+                price_below = float(match.group(1).replace(',', '.'))
+            elif match := DISCOUNT_RE.match(token):
+                discount_above = int(match.group(1))
+            elif token in STOCK_WORDS:
+                back_in_stock = True
+            else:
+                raise ValueError(f"Unknown watch threshold: {token}")
+        condition = cls(price_below, discount_above, back_in_stock)
+        if not condition:
+            raise ValueError("No watch threshold given")
+        return condition
+
+    def __bool__(self) -> bool:
+        return (self.price_below is not None
+                or self.discount_above is not None or self.back_in_stock)
+
+    def pack(self) -> str:
+        price = '' if self.price_below is None else self.price_below
+        discount = '' if self.discount_above is None else self.discount_above
+        return f"{price}|{discount}|{int(self.back_in_stock)}"
+
+    @classmethod
+    def unpack(cls, value: str) -> 'WatchCondition':
+        price, discount, stock = value.split('|')
+        return cls(float(price) if price else None,
+                   int(discount) if discount else None, stock == '1')
+
+    def matches(self, state: ProductState) -> bool:
+        if state.quantity == 0:
+            return False
+        if self.price_below is not None and state.price >= self.price_below:
+            return False
+        if self.discount_above is not None and \
+                state.discount <= self.discount_above:
+            return False
+        return True
+
+    def triggered(self, previous: ProductState | None,
+                  current: ProductState) -> bool:
+        """
+        Checks whether the product has just started to match the condition.
+
+        Args:
+            previous (Optional[ProductState]): The state seen on the last
+            poll, None for a product polled for the first time.
+            current (ProductState): The state seen on this poll.
+
+        Returns:
+            bool: True if the subscriber should be notified.
+        """
+        if not self.matches(current):
+            return False
+        if self.back_in_stock and (previous is None or previous.quantity):
+            return False
+        return previous is None or not self.matches(previous)
+
+    def describe(self) -> str:
+        parts = []
+        if self.price_below is not None:
+            parts.append(f"цена ниже {self.price_below:g} ₽")
+        if self.discount_above is not None:
+            parts.append(f"скидка больше {self.discount_above}%")
+        if self.back_in_stock:
+            parts.append("снова в наличии")
+        return ', '.join(parts)
+
+
+def parse_product_id(text: str) -> str | None:
+    """
+    Extracts the product ID from an ID or a product card link.
+
+    Args:
+        text (str): The ID or the link.
+
+    Returns:
+        Optional[str]: The product ID or None if none was found.
+    """
+    match = PRODUCT_ID_RE.search(text)
+    return match.group(1) if match else None
+
+
+class WatchEngine:
+    """
+    Polls all watched products with batched detail requests and notifies
+    the subscribers whose thresholds were just crossed. New watches are
+    checked against the current state on their first poll, as if the
+    product had not been seen before.
+    """
+
+    POLL_CHUNK = 1000
+
+    def __init__(self, db, notify: Callable[[int, str], Awaitable[Any]],
+                 parser: WBParser | None = None):
+        """
+        Initializes the WatchEngine.
+
+        Args:
+            db (RedisDB): The Redis database wrapper holding the watches.
+            notify (Callable[[int, str], Awaitable]): Sends a text to a chat,
+            e.g. SendQueue.send_message, which bounds the send rate.
+            parser (Optional[WBParser]): Parser used for detail requests.
+        """
+        self.db = db
+        self.notify = notify
+        self.parser = parser or WBParser(shard='', query='')
+
+    async def poll(self) -> int:
+        """
+        Polls every watched product once.
+
+        Returns:
+            int: The number of notifications sent.
+        """
+        product_ids = await self.db.get_watched_product_ids()
+        new_watches = await self.db.get_new_watches()
+        sent = 0
+        for i in range(0, len(product_ids), self.POLL_CHUNK):
+            sent += await self._poll_chunk(product_ids[i:i + self.POLL_CHUNK],
+                                           new_watches)
+        logger.info(f"Polled {len(product_ids)} watched products, "
+                    f"sent {sent} notifications.")
+        return sent
+
+    async def _poll_chunk(self, product_ids: list[str],
+                          new_watches: dict[str, set[str]]) -> int:
+        details = await self.parser.get_products_details(product_ids)
+        previous = await self.db.get_watch_states(product_ids)
+        states, changed, checked = {}, {}, {}
+        for product_id in product_ids:
+            product = details.get(int(product_id))
+            if product is None:
+                continue
+            try:
+                state = raw_product_state(product)
+            except (KeyError, IndexError, TypeError):
+                continue
+            packed = state.pack()
+            if product_id in new_watches:
+                checked[product_id] = new_watches[product_id]
+            elif previous.get(product_id) == packed:
+                continue
+            if previous.get(product_id) != packed:
+                states[product_id] = packed
+            changed[product_id] = (previous.get(product_id), state, product)
+
+        notifications = []
+        watches = await self.db.get_watches(list(changed))
+        for product_id, (packed, state, product) in changed.items():
+            previous_state = ProductState.unpack(packed) if packed else None
+            new_users = checked.get(product_id, set())
+            for user_id, condition in watches.get(product_id, {}).items():
+                condition = WatchCondition.unpack(condition)
+                if condition.triggered(
+                        None if user_id in new_users else previous_state,
+                        state):
+                    notifications.append(
+                        (int(user_id), format_watch_text(product, state,
+                                                         condition)))
+        await self.db.set_watch_states(states)
+        await self.db.clear_new_watches(checked)
+        results = await asyncio.gather(
+            *(self._send(chat_id, text) for chat_id, text in notifications))
+        return sum(results)
+
+    async def _send(self, chat_id: int, text: str) -> bool:
+        try:
+            await self.notify(chat_id, text)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to notify {chat_id}: {e}")
+            return False
+
+
+def format_watch_text(product: dict, state: ProductState,
+                      condition: WatchCondition) -> str:
+    return (f"🔔 <b>{product.get('brand', '')} {product.get('name', '')}</b>\n"
+            f"Сработало условие: {condition.describe()}\n"
+            f"Цена: {state.price:g} ₽, скидка {state.discount}%, "
+            f"в наличии {state.quantity} шт.\n"
+            f"{card_url(product['id'])}")